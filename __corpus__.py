@@ -0,0 +1,95 @@
+
+import mmap,numpy
+
+class corpus(object):
+
+    # Store a collection of sets as one contiguous array, in which the
+    # observations of each set are columns delimited by offsets. The
+    # array can be memory-mapped, e.g. by numpy.load(path,mmap_mode='r'),
+    # in which case the sets are never copied into memory at once.
+    def __init__(self,data,offset,chunksize=65536):
+
+        assert numpy.ndim(data)==2 and chunksize>0
+
+        offset=numpy.asarray(offset,dtype=int)
+
+        # Check that the offsets delimit the columns of the array.
+        assert numpy.ndim(offset)==1 and len(offset)>0 and offset[0]==0\
+               and offset[-1]==numpy.shape(data)[1] and all(numpy.diff(offset)>=0)
+
+        self.__data__=data
+        self.__offset__=offset
+        self.__chunksize__=chunksize
+
+        return
+
+    def __len__(self):
+        return len(self.__offset__)-1
+
+    def __getitem__(self,index):
+
+        offset=self.__offset__
+
+        # Select a contiguous range of sets as another corpus,
+        # or the observations of a single set as a view.
+        if isinstance(index,slice):
+            i,j,step=index.indices(len(self))
+            assert step==1
+            j=max(i,j)
+            return corpus(self.__data__[:,offset[i]:offset[j]],offset[i:j+1]-offset[i],
+                          chunksize=self.__chunksize__)
+
+        return self.__data__[:,offset[index]:offset[index+1]]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    @property
+    def data(self):
+        return self.__data__
+
+    @property
+    def offset(self):
+        return self.__offset__
+
+    @property
+    def dim(self):
+        return numpy.shape(self.__data__)[0]
+
+    @property
+    def numpoint(self):
+        return numpy.diff(self.__offset__)
+
+    @property
+    def chunksize(self):
+        return self.__chunksize__
+
+    @property
+    def source(self):
+
+        data=self.__data__
+
+        # Only an array which maps a whole file can be
+        # reopened by another process without copying.
+        if isinstance(data,numpy.memmap) and isinstance(data.base,mmap.mmap):
+            return data.filename,data.dtype,data.shape,data.offset,\
+                'F' if numpy.isfortran(data) else 'C'
+
+        return None
+
+    def chunks(self):
+        return chunks(self.__offset__,self.__chunksize__)
+
+def chunks(offset,chunksize):
+
+    i=0
+
+    # Split the sets, which are delimited by the offsets, into contiguous
+    # ranges, each of which has at most as many observations as the size
+    # of the chunks, unless a single set has more.
+    while i<len(offset)-1:
+        j=numpy.searchsorted(offset,offset[i]+chunksize,side='right')-1
+        j=min(max(j,i+1),len(offset)-1)
+        yield i,j
+        i=j
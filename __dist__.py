@@ -2,7 +2,11 @@
 import math,numpy
 
 from numpy import linalg,random
-from scipy import special
+from scipy import sparse,special
+from scipy.linalg import solve_triangular
+
+# Import the module-specific classes and functions.
+from __util__ import execute
 
 class dirich(object):
 
@@ -319,9 +323,9 @@ class gaussgamma(object):
 
         # Copy the parameters of the posterior
         # distribution from the prior distribution.
-        self.__param__.mu[:]=other.__param__.mu
+        self.__param__.mu=numpy.copy(other.__param__.mu)
         self.__param__.omega=other.__param__.omega
-        self.__param__.sigma[:]=other.__param__.sigma
+        self.__param__.sigma=numpy.copy(other.__param__.sigma)
         self.__param__.eta=other.__param__.eta
 
         return self
@@ -378,17 +382,17 @@ class gaussgamma(object):
         # Compute half of the expected log-determinant.
         logdet=numpy.log(sigma).sum()/2.0
         if numpy.isfinite(eta):
-            logdet+=(dim/2.0)*math.log(eta/2.0)-special.psi((eta-numpy.arange(dim))/2.0)/2.0
+            logdet+=(dim/2.0)*(math.log(eta/2.0)-special.psi(eta/2.0))
 
         if nu is None:
 
             # Evaluate the expected log-likelihood of the observations.
-            return -(numdim/2.0)*math.log(2.0*math.pi)-logdet-sqerr/2.0
+            return -(dim/2.0)*math.log(2.0*math.pi)-logdet-sqerr/2.0
 
         elif numpy.isinf(nu):
 
             # Evaluate the expected log-likelihood of the observations, and the mixing weights.
-            return -(numdim/2.0)*math.log(2.0*math.pi)-logdet-sqerr/2.0,numpy.ones(size)
+            return -(dim/2.0)*math.log(2.0*math.pi)-logdet-sqerr/2.0,numpy.ones(size)
 
         else:
 
@@ -637,6 +641,7 @@ class gausswish(object):
         omega=None
         sigma=None
         eta=None
+        cache=None
 
     def __init__(self,dim,mu=None,omega=None,sigma=None,eta=None):
 
@@ -709,6 +714,7 @@ class gausswish(object):
                and (linalg.eigvals(sigma)>0.0).all()
 
         self.__param__.sigma=numpy.copy(sigma)
+        self.__param__.cache=None
 
     @property
     def eta(self):
@@ -722,6 +728,7 @@ class gausswish(object):
         assert not numpy.isnan(eta) and eta>self.__dim__-1.0
 
         self.__param__.eta=float(eta)
+        self.__param__.cache=None
 
     def copy(self,other):
 
@@ -729,13 +736,42 @@ class gausswish(object):
 
         # Copy the parameters of the posterior
         # distribution from the prior distribution.
-        self.__param__.mu[:]=other.__param__.mu
+        self.__param__.mu=numpy.copy(other.__param__.mu)
         self.__param__.omega=other.__param__.omega
-        self.__param__.sigma[:]=other.__param__.sigma
+        self.__param__.sigma=numpy.copy(other.__param__.sigma)
         self.__param__.eta=other.__param__.eta
+        self.__param__.cache=None
 
         return self
 
+    def __precomp__(self):
+
+        cache=self.__param__.cache
+
+        if cache is not None:
+            return cache
+
+        dim=self.__dim__
+
+        sigma=self.__param__.sigma
+        eta=self.__param__.eta
+
+        cache=gausswish.param()
+
+        # Factorize the scale matrix, and compute half of its log-determinant
+        # and the digamma terms of the expected log-determinant. These are
+        # kept until the scale matrix or the degrees of freedom change.
+        cache.fact=linalg.cholesky(sigma)
+        cache.logdet=numpy.log(numpy.diagonal(cache.fact)).sum()
+        if numpy.isfinite(eta):
+            cache.psi=special.psi((eta-numpy.arange(dim))/2.0).sum()
+        else:
+            cache.psi=numpy.nan
+
+        self.__param__.cache=cache
+
+        return cache
+
     def rand(self):
 
         dim=self.__dim__
@@ -750,7 +786,7 @@ class gausswish(object):
             # Simulate the marginal Wishart distribution.
             diag=2.0*random.gamma((eta-numpy.arange(dim))/2.0)
             fact=numpy.diag(numpy.sqrt(diag))+numpy.tril(random.randn(dim,dim),-1)
-            fact=linalg.solve(fact,math.sqrt(eta)*linalg.cholesky(sigma).transpose())
+            fact=solve_triangular(fact,math.sqrt(eta)*self.__precomp__().fact.transpose(),lower=True)
             disp=numpy.dot(fact.transpose(),fact)
 
         else:
@@ -783,27 +819,27 @@ class gausswish(object):
         sigma=self.__param__.sigma
         eta=self.__param__.eta
 
-        fact=linalg.cholesky(sigma)
+        cache=self.__precomp__()
 
         # Compute the expected squared error.
-        sqerr=(numpy.abs(linalg.solve(fact,obs-mu[:,numpy.newaxis]))**2).sum(axis=0)
+        sqerr=(numpy.abs(solve_triangular(cache.fact,obs-mu[:,numpy.newaxis],lower=True))**2).sum(axis=0)
         if numpy.isfinite(omega):
             sqerr+=dim/omega
 
         # Compute half of the expected log-determinant.
-        logdet=numpy.log(numpy.diag(fact)).sum()
+        logdet=cache.logdet
         if numpy.isfinite(eta):
-            logdet+=(dim/2.0)*math.log(eta/2.0)-special.psi((eta-numpy.arange(dim))/2.0).sum()/2.0
+            logdet+=(dim/2.0)*math.log(eta/2.0)-cache.psi/2.0
 
         if nu is None:
 
             # Evaluate the expected log-likelihood of the observations.
-            return -(numdim/2.0)*math.log(2.0*math.pi)-logdet-sqerr/2.0
+            return -(dim/2.0)*math.log(2.0*math.pi)-logdet-sqerr/2.0
 
         elif numpy.isinf(nu):
 
             # Evaluate the expected log-likelihood of the observations, and the mixing weights.
-            return -(numdim/2.0)*math.log(2.0*math.pi)-logdet-sqerr/2.0,numpy.ones(size)
+            return -(dim/2.0)*math.log(2.0*math.pi)-logdet-sqerr/2.0,numpy.ones(size)
 
         else:
 
@@ -833,14 +869,15 @@ class gausswish(object):
         prior.sigma=other.__param__.sigma
         prior.eta=other.__param__.eta
 
-        post.fact=linalg.cholesky(post.sigma)
+        post.cache=self.__precomp__()
 
         if numpy.isfinite(post.omega) and numpy.isfinite(prior.omega):
 
             # Compute the expected divergence between the posterior
             # and the prior conditional Gauss distributions.
             div=(dim/2.0)*(prior.omega/post.omega-math.log(prior.omega/post.omega)-1.0)\
-                +(prior.omega/2.0)*(numpy.abs(linalg.solve(post.fact,post.mu-prior.mu))**2).sum()
+                +(prior.omega/2.0)*(numpy.abs(solve_triangular(post.cache.fact,post.mu-prior.mu,
+                                                               lower=True))**2).sum()
 
         elif numpy.isinf(post.omega) and numpy.isinf(prior.omega)\
              and numpy.equal(post.mu,prior.mu).all():
@@ -859,19 +896,19 @@ class gausswish(object):
 
         if numpy.isfinite(post.eta) and numpy.isfinite(prior.eta):
 
-            prior.fact=linalg.cholesky(prior.sigma)
+            prior.cache=other.__precomp__()
 
             # Calculate half of the log-determinants.
-            post.det=numpy.log(numpy.diagonal(post.fact)).sum()
-            prior.det=numpy.log(numpy.diagonal(prior.fact)).sum()
+            post.det=post.cache.logdet
+            prior.det=prior.cache.logdet
 
-            aux=(dim/2.0)*math.log(post.eta/2.0)\
-                -special.psi((post.eta-numpy.arange(dim))/2.0).sum()/2.0
+            aux=(dim/2.0)*math.log(post.eta/2.0)-post.cache.psi/2.0
 
             # Add the divergence between the posterior and
             # the prior marginal Wishart distributions.
             return div-(post.eta/2.0)*dim\
-                   +(prior.eta/2.0)*(numpy.abs(linalg.solve(post.fact,prior.fact))**2).sum()\
+                   +(prior.eta/2.0)*(numpy.abs(solve_triangular(post.cache.fact,prior.cache.fact,
+                                                                lower=True))**2).sum()\
                    +(prior.eta-post.eta)*(post.det+aux)-prior.eta*prior.det+post.eta*post.det\
                    +special.gammaln((prior.eta-numpy.arange(dim))/2.0).sum()\
                    -special.gammaln((post.eta-numpy.arange(dim))/2.0).sum()\
@@ -1055,5 +1092,1730 @@ class gausswish(object):
         self.__param__.omega=omega
         self.__param__.sigma=sigma
         self.__param__.eta=eta
+        self.__param__.cache=None
+
+        return self
+
+class bankview(object):
+
+    # Define a structure-like container
+    # class which exposes the parameters
+    # of one distribution in a bank as
+    # views into the stacked arrays.
+    def __init__(self,bank,index):
+
+        self.__bank__=bank
+        self.__index__=index
+
+        return
+
+    @property
+    def cache(self):
+
+        cache=self.__bank__.cache
+
+        # Select the quantities of the distribution
+        # from those which are cached by the bank.
+        view=type(cache)()
+        for name,val in vars(cache).items():
+            setattr(view,name,val[self.__index__])
+
+        return view
+
+    @cache.setter
+    def cache(self,cache):
+
+        assert cache is None
+
+        self.__bank__.__cache__=None
+
+    @property
+    def pi(self):
+        return self.__bank__.__param__.pi[self.__index__]
+
+    @pi.setter
+    def pi(self,pi):
+        self.__bank__.__param__.pi[self.__index__]=pi
+        self.__bank__.__cache__=None
+
+    @property
+    def alpha(self):
+        return float(self.__bank__.__param__.alpha[self.__index__])
+
+    @alpha.setter
+    def alpha(self,alpha):
+        self.__bank__.__param__.alpha[self.__index__]=alpha
+        self.__bank__.__cache__=None
+
+    @property
+    def mu(self):
+        return self.__bank__.__param__.mu[self.__index__]
+
+    @mu.setter
+    def mu(self,mu):
+        self.__bank__.__param__.mu[self.__index__]=mu
+        self.__bank__.__cache__=None
+
+    @property
+    def omega(self):
+        return float(self.__bank__.__param__.omega[self.__index__])
+
+    @omega.setter
+    def omega(self,omega):
+        self.__bank__.__param__.omega[self.__index__]=omega
+        self.__bank__.__cache__=None
+
+    @property
+    def sigma(self):
+        return self.__bank__.__param__.sigma[self.__index__]
+
+    @sigma.setter
+    def sigma(self,sigma):
+        self.__bank__.__param__.sigma[self.__index__]=sigma
+        self.__bank__.__cache__=None
+
+    @property
+    def eta(self):
+        return float(self.__bank__.__param__.eta[self.__index__])
+
+    @eta.setter
+    def eta(self,eta):
+        self.__bank__.__param__.eta[self.__index__]=eta
+        self.__bank__.__cache__=None
+
+class dirichbank(object):
+
+    # Define a structure-like container
+    # class for storing the stacked
+    # parameters of a bank of Dirichlet
+    # distributions.
+    class param:
+        pi=None
+        alpha=None
+
+    def __init__(self,size,dim,pi=None,alpha=None):
+
+        assert size>0 and dim>0
+
+        # Define default values
+        # for the parameters.
+        if pi is None:
+            pi=numpy.repeat(1.0/dim,dim)
+        if alpha is None:
+            alpha=1.0
+
+        self.__size__=size
+        self.__dim__=dim
+        self.__param__=dirichbank.param()
+
+        # Initialize the parameters, so that every
+        # distribution in the bank is identical.
+        self.__param__.pi=numpy.zeros([size,dim])
+        self.__param__.alpha=numpy.zeros(size)
+
+        self.__param__.pi[:]=pi
+        self.__param__.alpha[:]=alpha
+
+        self.__cache__=None
+
+        return
+
+    def __len__(self):
+        return self.__size__
+
+    def __getitem__(self,index):
+
+        # Copy a contiguous range of the
+        # distributions into another bank.
+        if isinstance(index,slice):
+            i,j,step=index.indices(self.__size__)
+            assert step==1 and j>i
+            return dirichbank(j-i,self.__dim__,pi=self.__param__.pi[i:j,:],alpha=self.__param__.alpha[i:j])
+
+        assert -self.__size__<=index<self.__size__
+
+        # Create a distribution whose
+        # parameters are views into
+        # the stacked arrays.
+        dist=dirich.__new__(dirich)
+        dist.__dim__=self.__dim__
+        dist.__param__=bankview(self,index%self.__size__)
+
+        return dist
+
+    def __iter__(self):
+        return (self[k] for k in range(self.__size__))
+
+    @property
+    def size(self):
+        return self.__size__
+
+    @property
+    def dim(self):
+        return self.__dim__
+
+    @property
+    def pi(self):
+        return self.__param__.pi
+
+    @pi.setter
+    def pi(self,pi):
+        self.__param__.pi[:]=pi
+
+    @property
+    def alpha(self):
+        return self.__param__.alpha
+
+    @alpha.setter
+    def alpha(self,alpha):
+        self.__param__.alpha[:]=alpha
+
+    def copy(self,other):
+
+        assert len(other)==self.__size__
+
+        if isinstance(other,dirichbank):
+
+            assert other.__dim__==self.__dim__
+
+            # Copy the stacked parameters of the
+            # posterior distributions from the
+            # prior distributions.
+            self.__param__.pi[:]=other.__param__.pi
+            self.__param__.alpha[:]=other.__param__.alpha
+
+        else:
+
+            assert all(isinstance(d,dirich) and d.dim==self.__dim__ for d in other)
+
+            # Stack the parameters of the distributions.
+            for k,d in enumerate(other):
+                self.__param__.pi[k,:]=d.pi
+                self.__param__.alpha[k]=d.alpha
+
+        return self
+
+    def rand(self):
+
+        pi=self.__param__.pi
+        alpha=self.__param__.alpha
+
+        prop=numpy.copy(pi)
+
+        # Simulate the Dirichlet distributions,
+        # except for those which are singular.
+        ind,=numpy.where(numpy.isfinite(alpha))
+        prop[ind,:]=random.gamma(alpha[ind,numpy.newaxis]*pi[ind,:])/alpha[ind,numpy.newaxis]
+        prop[ind,:]/=prop[ind,:].sum(axis=1,keepdims=True)
+
+        return prop
+
+    def loglik(self):
+
+        pi=self.__param__.pi
+        alpha=self.__param__.alpha
+
+        val=numpy.zeros([self.__size__,self.__dim__])
+
+        val[:]=-numpy.inf
+
+        # Evaluate the expected log-likelihoods of the distributions
+        # which are not singular, where the proportions are positive.
+        fin=numpy.isfinite(alpha)
+        ind=numpy.logical_and(fin[:,numpy.newaxis],pi>0.0)
+        val[ind]=special.psi((alpha[:,numpy.newaxis]*pi)[ind])\
+            -special.psi(numpy.broadcast_to(alpha[:,numpy.newaxis],pi.shape)[ind])
+
+        # Evaluate the log-likelihoods of the singular distributions.
+        with numpy.errstate(divide='ignore'):
+            val[~fin,:]=numpy.log(pi[~fin,:])
+
+        return val
+
+    def div(self,other):
+
+        assert isinstance(other,dirichbank) and other.__size__==self.__size__\
+               and other.__dim__==self.__dim__
+
+        post=self.__param__
+        prior=other.__param__
+
+        div=numpy.zeros(self.__size__)
+
+        div[:]=numpy.inf
+
+        supp=post.pi>0.0
+
+        # Both distributions must have the same support,
+        # otherwise the divergence is infinite.
+        fin=numpy.isfinite(post.alpha)&numpy.isfinite(prior.alpha)\
+            &~numpy.logical_xor(supp,prior.pi>0.0).any(axis=1)
+
+        ind,=numpy.where(fin)
+
+        postconc=numpy.where(supp[ind,:],post.alpha[ind,numpy.newaxis]*post.pi[ind,:],1.0)
+        priorconc=numpy.where(supp[ind,:],prior.alpha[ind,numpy.newaxis]*prior.pi[ind,:],1.0)
+
+        # Compute the divergences between the posterior
+        # and the prior Dirichlet distributions.
+        div[ind]=special.gammaln(post.alpha[ind])-special.gammaln(prior.alpha[ind])\
+            -(special.gammaln(postconc)-special.gammaln(priorconc)).sum(axis=1)\
+            +((postconc-priorconc)*(special.psi(postconc)-special.psi(post.alpha[ind,numpy.newaxis]))).sum(axis=1)
+
+        # The divergence vanishes if both distributions
+        # have exactly the same parameters, even if
+        # they are singular.
+        ind=numpy.isinf(post.alpha)&numpy.isinf(prior.alpha)&numpy.equal(post.pi,prior.pi).all(axis=1)
+        div[ind]=0.0
+
+        return div
+
+    def stat(self,evidence):
+
+        size=self.__size__
+        dim=self.__dim__
+
+        stat=dirichbank.param()
+
+        # Initialize the expected
+        # sufficient statistics.
+        stat.pi=numpy.zeros([size,dim])
+        stat.alpha=numpy.zeros(size)
+
+        for prob in evidence:
+
+            assert numpy.ndim(prob)==3 and numpy.shape(prob)[:2]==(size,dim)
+
+            count=numpy.sum(prob,axis=2)
+
+            # Update the expected
+            # sufficient statistics.
+            stat.pi+=count
+            stat.alpha+=count.sum(axis=1)
+
+        return stat
+
+    def update(self,stat):
+
+        size=self.__size__
+        dim=self.__dim__
+
+        assert isinstance(stat,dirichbank.param) and numpy.shape(stat.pi)==(size,dim)
+
+        pi=self.__param__.pi
+        alpha=self.__param__.alpha
+
+        # Update the parameters to reflect the information gained
+        # from the data, except for the distributions which are
+        # singular.
+        ind,=numpy.where(numpy.isfinite(alpha))
+        pi[ind,:]=alpha[ind,numpy.newaxis]*pi[ind,:]+stat.pi[ind,:]
+        alpha[ind]+=stat.alpha[ind]
+        pi[ind,:]/=alpha[ind,numpy.newaxis]
+
+        return self
+
+class gaussgammabank(object):
+
+    # Define a structure-like container
+    # class for storing the stacked
+    # parameters of a bank of Gauss-Gamma
+    # distributions.
+    class param:
+        mu=None
+        omega=None
+        sigma=None
+        eta=None
+
+    # Define a container for the residuals
+    # of a set of observations about their
+    # mean, and their squares.
+    class summary:
+        ref=None
+        resid=None
+        sq=None
+
+        @property
+        def nbytes(self):
+            return self.resid.nbytes+self.sq.nbytes
+
+    def __init__(self,size,dim,mu=None,omega=None,sigma=None,eta=None,dtype=numpy.float64,threads=1):
+
+        assert size>0 and dim>0 and threads>0
+
+        # Define default values
+        # for the parameters.
+        if mu is None:
+            mu=numpy.zeros(dim)
+        if omega is None:
+            omega=1.0
+        if sigma is None:
+            sigma=numpy.ones(dim)
+        if eta is None:
+            eta=1.0
+
+        self.__size__=size
+        self.__dim__=dim
+        self.__dtype__=numpy.dtype(dtype)
+        self.__threads__=threads
+        self.__param__=gaussgammabank.param()
+
+        # Initialize the parameters, so that every
+        # distribution in the bank is identical.
+        self.__param__.mu=numpy.zeros([size,dim])
+        self.__param__.omega=numpy.zeros(size)
+        self.__param__.sigma=numpy.zeros([size,dim])
+        self.__param__.eta=numpy.zeros(size)
+
+        self.__param__.mu[:]=mu
+        self.__param__.omega[:]=omega
+        self.__param__.sigma[:]=sigma
+        self.__param__.eta[:]=eta
+
+        self.__cache__=None
+
+        return
+
+    def __len__(self):
+        return self.__size__
+
+    def __getitem__(self,index):
+
+        assert -self.__size__<=index<self.__size__
+
+        # Create a distribution whose
+        # parameters are views into
+        # the stacked arrays.
+        dist=gaussgamma.__new__(gaussgamma)
+        dist.__dim__=self.__dim__
+        dist.__param__=bankview(self,index%self.__size__)
+
+        return dist
+
+    def __iter__(self):
+        return (self[k] for k in range(self.__size__))
+
+    @property
+    def size(self):
+        return self.__size__
+
+    @property
+    def dim(self):
+        return self.__dim__
+
+    @property
+    def dtype(self):
+        return self.__dtype__
+
+    @property
+    def threads(self):
+        return self.__threads__
+
+    @property
+    def cache(self):
+        return self.__cache__ if self.__cache__ is not None else self.__precomp__()
+
+    @property
+    def mu(self):
+        return self.__param__.mu
+
+    @mu.setter
+    def mu(self,mu):
+        self.__param__.mu[:]=mu
+        self.__cache__=None
+
+    @property
+    def omega(self):
+        return self.__param__.omega
+
+    @omega.setter
+    def omega(self,omega):
+        self.__param__.omega[:]=omega
+        self.__cache__=None
+
+    @property
+    def sigma(self):
+        return self.__param__.sigma
+
+    @sigma.setter
+    def sigma(self,sigma):
+        self.__param__.sigma[:]=sigma
+        self.__cache__=None
+
+    @property
+    def eta(self):
+        return self.__param__.eta
+
+    @eta.setter
+    def eta(self,eta):
+        self.__param__.eta[:]=eta
+        self.__cache__=None
+
+    def copy(self,other):
+
+        assert len(other)==self.__size__
+
+        if isinstance(other,gaussgammabank):
+
+            assert other.__dim__==self.__dim__
+
+            # Copy the stacked parameters of the
+            # posterior distributions from the
+            # prior distributions.
+            self.__param__.mu[:]=other.__param__.mu
+            self.__param__.omega[:]=other.__param__.omega
+            self.__param__.sigma[:]=other.__param__.sigma
+            self.__param__.eta[:]=other.__param__.eta
+
+        else:
+
+            assert all(isinstance(d,gaussgamma) and d.dim==self.__dim__ for d in other)
+
+            # Stack the parameters of the distributions.
+            for k,d in enumerate(other):
+                self.__param__.mu[k,:]=d.mu
+                self.__param__.omega[k]=d.omega
+                self.__param__.sigma[k,:]=d.sigma
+                self.__param__.eta[k]=d.eta
+
+        self.__cache__=None
+
+        return self
+
+    def take(self,index):
+
+        param=self.__param__
+
+        # Copy the selected distributions into another bank.
+        return gaussgammabank(len(index),self.__dim__,mu=param.mu[index],omega=param.omega[index],
+                             sigma=param.sigma[index],eta=param.eta[index],dtype=self.__dtype__,
+                             threads=self.__threads__)
+
+    def summarize(self,obs):
+
+        assert numpy.ndim(obs)==2
+        dim,numpoint=numpy.shape(obs)
+        assert dim==self.__dim__
+
+        # The summaries are kept in double precision, like
+        # the products which are formed by stat.
+        obs=numpy.asarray(obs,dtype=numpy.float64)
+
+        summary=gaussgammabank.summary()
+
+        # Take the residuals about the mean of the observations, so that
+        # their squares can be reduced by each call of stat instead of
+        # being recomputed.
+        summary.ref=obs.mean(axis=1,dtype=numpy.float64) if numpoint>0 else numpy.zeros(dim)
+        summary.resid=obs-summary.ref[:,numpy.newaxis]
+        summary.sq=numpy.abs(summary.resid)**2
+
+        return summary
+
+    def summarysize(self,numpoint):
+
+        # Count the bytes of the residuals and
+        # their squares without building them.
+        return 2*self.__dim__*numpoint*numpy.dtype(numpy.float64).itemsize
+
+    def __precomp__(self):
+
+        dim=self.__dim__
+
+        mu=self.__param__.mu
+        omega=self.__param__.omega
+        sigma=self.__param__.sigma
+        eta=self.__param__.eta
+
+        cache=gaussgammabank.param()
+
+        # Store the terms of the expanded
+        # squared error, so that it can be
+        # evaluated by matrix products.
+        cache.prec=1.0/sigma
+        cache.shift=cache.prec*mu
+        cache.quad=(cache.shift*mu).sum(axis=1)
+        cache.const=dim/omega
+
+        # Compute half of the expected log-determinants.
+        cache.logdet=numpy.log(sigma).sum(axis=1)/2.0
+        ind,=numpy.where(numpy.isfinite(eta))
+        cache.logdet[ind]+=(dim/2.0)*(numpy.log(eta[ind]/2.0)-special.psi(eta[ind]/2.0))
+
+        self.__cache__=cache
+
+        return cache
+
+    def rand(self):
+
+        size=self.__size__
+        dim=self.__dim__
+
+        mu=self.__param__.mu
+        omega=self.__param__.omega
+        sigma=self.__param__.sigma
+        eta=self.__param__.eta
+
+        disp=numpy.copy(sigma)
+        loc=numpy.copy(mu)
+
+        # Simulate the marginal Gamma distributions, except
+        # for those which are singular.
+        ind,=numpy.where(numpy.isfinite(eta))
+        disp[ind,:]/=random.gamma(eta[ind,numpy.newaxis]/2.0,size=[len(ind),dim])\
+            /(eta[ind,numpy.newaxis]/2.0)
+
+        # Simulate the conditional Gauss distributions, except
+        # for those which are singular.
+        ind,=numpy.where(numpy.isfinite(omega))
+        loc[ind,:]+=(numpy.sqrt(disp[ind,:])*random.randn(len(ind),dim))\
+            /numpy.sqrt(omega[ind,numpy.newaxis])
+
+        return loc,disp
+
+    def loglik(self,obs,nu=None,index=None):
+
+        dim,size=numpy.shape(obs)
+
+        numblock=min(self.__threads__,size//1024)
+
+        if numblock<2:
+            return self.__loglik__(obs,nu=nu,index=index)
+
+        # Compute the cache once, rather than in each thread.
+        if self.__cache__ is None:
+            self.__precomp__()
+
+        split=numpy.linspace(0,size,numblock+1).astype(int)
+
+        def block(s):
+            return self.__loglik__(obs[:,s],nu=nu,index=index[:,s] if index is not None else None)
+
+        # Evaluate blocks of the observations by a pool of threads. The
+        # products release the interpreter, so the blocks run concurrently.
+        val=execute(self.__threads__,block,[slice(i,j) for i,j in zip(split[:-1],split[1:])])
+
+        if nu is None:
+            return numpy.concatenate(val,axis=1)
+
+        return tuple(numpy.concatenate(v,axis=1) for v in zip(*val))
+
+    def __loglik__(self,obs,nu=None,index=None):
+
+        assert numpy.ndim(obs)==2
+        dim,size=numpy.shape(obs)
+        assert dim==self.__dim__
+
+        dtype=self.__dtype__
+
+        # The parameters are kept in double precision, but the observations
+        # and the quantities of each observation are in the precision of
+        # the bank.
+        obs=numpy.asarray(obs,dtype=dtype)
+
+        cache=self.cache
+
+        if index is None and dtype==numpy.float64:
+
+            # Compute the expected squared errors of all the components at
+            # once, by the matrix products of the expanded squared errors.
+            sqerr=numpy.dot(cache.prec,obs**2)-2.0*numpy.dot(cache.shift,obs)\
+                +(cache.quad+cache.const)[:,numpy.newaxis]
+
+            logdet=cache.logdet[:,numpy.newaxis]
+
+        elif index is None:
+
+            prec=cache.prec.astype(dtype)
+            mu=self.__param__.mu.astype(dtype)
+
+            sqerr=numpy.zeros([self.__size__,size],dtype=dtype)
+
+            # The terms of the expanded squared errors cancel in single
+            # precision, so they are reduced from the squared residuals
+            # instead, which are formed for blocks of observations, which
+            # bound their size.
+            step=max(2**18//(self.__size__*dim),1)
+
+            for i in range(0,size,step):
+                x=obs[numpy.newaxis,:,i:i+step]-mu[:,:,numpy.newaxis]
+                sqerr[:,i:i+step]=numpy.matmul(prec[:,numpy.newaxis,:],x**2)[:,0,:]
+
+            sqerr+=cache.const.astype(dtype)[:,numpy.newaxis]
+
+            logdet=cache.logdet.astype(dtype)[:,numpy.newaxis]
+
+        else:
+
+            prec=cache.prec.astype(dtype)
+            mu=self.__param__.mu.astype(dtype)
+
+            numcand=numpy.shape(index)[0]
+
+            sqerr=numpy.zeros([numcand,size],dtype=dtype)
+
+            # Only compute the expected squared errors of the components which
+            # are selected for each observation. Their parameters are gathered
+            # for blocks of observations, which bound the size of the copies.
+            step=max(2**18//(numcand*dim),1)
+
+            for i in range(0,size,step):
+                ind=index[:,i:i+step]
+                x=obs[:,i:i+step].transpose()[numpy.newaxis,:,:]
+                sqerr[:,i:i+step]=(prec[ind,:]*(x-mu[ind,:])**2).sum(axis=2)
+
+            sqerr+=cache.const.astype(dtype)[index]
+
+            logdet=cache.logdet.astype(dtype)[index]
+
+        numpy.maximum(sqerr,0.0,out=sqerr)
+
+        if nu is None:
+
+            # Evaluate the expected log-likelihood of the observations.
+            return -(dim/2.0)*math.log(2.0*math.pi)-logdet-sqerr/2.0
+
+        elif numpy.isinf(nu):
+
+            # Evaluate the expected log-likelihood of the observations, and the mixing weights.
+            return -(dim/2.0)*math.log(2.0*math.pi)-logdet-sqerr/2.0,numpy.ones_like(sqerr)
+
+        else:
+
+            const=special.gammaln(nu/2.0)-special.gammaln((nu+dim)/2.0)\
+                +(dim/2.0)*math.log(math.pi*nu)+logdet
+
+            const=const.astype(dtype)
+            nu=dtype.type(nu)
+
+            # Evaluate the expected log-likelihood of the observations, and the
+            # expected value of the posterior distribution over mixing weights.
+            return -const-((nu+dim)/2.0)*numpy.log1p(sqerr/nu),(nu+dim)/(nu+sqerr)
+
+    def div(self,other,index=None):
+
+        assert isinstance(other,gaussgammabank) and other.__dim__==self.__dim__
+
+        # Pair the distributions of the banks one to one, unless
+        # the pairs of the indices of the distributions are given.
+        if index is None:
+            assert other.__size__==self.__size__
+            index=numpy.arange(self.__size__),numpy.arange(self.__size__)
+
+        left,right=index
+
+        dim=self.__dim__
+
+        post=self.__param__
+        prior=other.__param__
+
+        div=numpy.zeros(len(left))
+
+        # Only evaluate the divergences between non-singular
+        # distributions in bulk. Defer to the individual
+        # distributions to handle the special cases.
+        fin=numpy.isfinite(post.omega[left])&numpy.isfinite(prior.omega[right])\
+            &numpy.isfinite(post.eta[left])&numpy.isfinite(prior.eta[right])
+
+        ind,=numpy.where(fin)
+
+        postind=left[ind]
+        priorind=right[ind]
+
+        # Compute the expected divergences between the posterior
+        # and the prior conditional Gauss distributions.
+        ratio=prior.omega[priorind]/post.omega[postind]
+        div[ind]=(dim/2.0)*(ratio-numpy.log(ratio)-1.0)\
+            +(prior.omega[priorind]/2.0)*((numpy.abs(post.mu[postind,:]-prior.mu[priorind,:])**2)
+                                          /post.sigma[postind,:]).sum(axis=1)
+
+        # Calculate the log-determinants.
+        postdet=numpy.log(post.sigma[postind,:]).sum(axis=1)
+        priordet=numpy.log(prior.sigma[priorind,:]).sum(axis=1)
+
+        posteta=post.eta[postind]
+        prioreta=prior.eta[priorind]
+
+        aux=numpy.log(posteta/2.0)-special.psi(posteta/2.0)
+
+        # Add the divergences between the posterior
+        # and the prior marginal Gamma distributions.
+        div[ind]+=-(posteta/2.0)*dim\
+            +(prioreta/2.0)*(prior.sigma[priorind,:]/post.sigma[postind,:]).sum(axis=1)\
+            +((prioreta-posteta)/2.0)*(postdet+dim*aux)\
+            -(prioreta/2.0)*priordet+(posteta/2.0)*postdet\
+            +dim*special.gammaln(prioreta/2.0)\
+            -dim*special.gammaln(posteta/2.0)\
+            -dim*(prioreta/2.0)*numpy.log(prioreta/2.0)\
+            +dim*(posteta/2.0)*numpy.log(posteta/2.0)
+
+        for k in numpy.where(~fin)[0]:
+            div[k]=self[left[k]].div(other[right[k]])
+
+        return div
+
+    def stat(self,evidence,weighted=False,scaled=False):
+
+        threads=self.__threads__
+
+        if threads<2:
+            return self.__stat__(evidence,weighted=weighted,scaled=scaled)
+
+        block=[]
+
+        # Split the evidence into blocks of the observations.
+        for item in evidence:
+
+            obs=item[0] if isinstance(item,tuple) else item
+
+            # Summaries are
+            # not split.
+            if isinstance(obs,gaussgammabank.summary):
+                block.append(item)
+                continue
+
+            size=numpy.shape(obs)[1]
+            split=numpy.linspace(0,size,max(min(threads,size//1024),1)+1).astype(int)
+
+            for i,j in zip(split[:-1],split[1:]):
+                if isinstance(item,tuple):
+                    block.append(tuple(x[:,i:j] if x is not None else None for x in item))
+                else:
+                    block.append(item[:,i:j])
+
+        # Accumulate the statistics of the blocks by a pool of threads, each
+        # of which takes every few blocks, and merge them.
+        stat=execute(threads,lambda part:self.__stat__(part,weighted=weighted,scaled=scaled),
+                     [block[t::threads] for t in range(min(threads,len(block)))])
+
+        return self.merge(stat) if len(stat)>0 else self.__stat__([],weighted=weighted,scaled=scaled)
+
+    def __stat__(self,evidence,weighted=False,scaled=False):
+
+        size=self.__size__
+        dim=self.__dim__
+
+        stat=gaussgammabank.param()
+
+        # Initialize the expected
+        # sufficient statistics.
+        stat.mu=numpy.zeros([size,dim])
+        stat.omega=numpy.zeros(size)
+        stat.sigma=numpy.zeros([size,dim])
+        stat.eta=numpy.zeros(size)
+
+        # Accumulate the moments about a reference point which is common
+        # to all the components, so that each set of data is traversed
+        # once, regardless of the number of components.
+        ref=self.__param__.mu.mean(axis=0)
+
+        # The products are formed in double precision, whatever the
+        # precision of the bank, since the moments about the reference
+        # point cancel when they are centred on the sample means.
+        dtype=numpy.float64
+
+        # Accumulate the expected
+        # sufficient statistics.
+        for item in evidence:
+
+            if weighted and scaled:
+                obs,weight,scale=item
+            elif weighted:
+                obs,weight=item
+                scale=None
+            elif scaled:
+                obs,scale=item
+                weight=None
+            else:
+                obs=item
+                weight=scale=None
+
+            # A summary holds the residuals about its own reference
+            # point, which are shifted to the common one once they
+            # have been reduced.
+            if isinstance(obs,gaussgammabank.summary):
+                resid,sq,shift=obs.resid,obs.sq,obs.ref-ref
+            else:
+                assert numpy.ndim(obs)==2
+
+                resid=numpy.asarray(obs,dtype=dtype)-ref[:,numpy.newaxis]
+                sq=shift=None
+
+            dim,numpoint=numpy.shape(resid)
+            assert dim==self.__dim__
+
+            # Check that the sizes match.
+            if weight is None:
+                weight=numpy.ones([size,numpoint],dtype=dtype)
+            else:
+                assert numpy.shape(weight)==(size,numpoint)
+            if scale is None:
+                scale=numpy.ones([size,numpoint],dtype=dtype)
+            else:
+                assert numpy.shape(scale)==(size,numpoint)
+
+            # Sparse scales only accumulate the statistics of their nonzero
+            # entries. Sparse weights which share the structure of the scales
+            # are multiplied by their stored entries.
+            if sparse.issparse(scale) and sparse.issparse(weight) and scale.format==weight.format in ('csr','csc')\
+               and numpy.array_equal(scale.indptr,weight.indptr) and numpy.array_equal(scale.indices,weight.indices):
+                weight=type(scale)((numpy.multiply(weight.data,scale.data,dtype=dtype),scale.indices,scale.indptr),
+                                   shape=scale.shape)
+            elif sparse.issparse(scale):
+                weight=scale.multiply(weight).astype(dtype).tocsr()
+            else:
+                weight=numpy.multiply(weight,scale,dtype=dtype)
+
+            if sq is None:
+                sq=numpy.abs(resid)**2
+
+            # Update the statistics of the conditional Gauss distributions.
+            mu=weight.dot(resid.transpose())
+            omega=weight.sum(axis=1,dtype=numpy.float64)
+
+            # Update the statistics of the marginal Gamma distributions.
+            stat.sigma+=weight.dot(sq.transpose())
+            stat.eta+=scale.sum(axis=1,dtype=numpy.float64)
+
+            if shift is not None:
+                stat.sigma+=2.0*mu*shift+omega[:,numpy.newaxis]*shift**2
+                mu=mu+omega[:,numpy.newaxis]*shift
+
+            stat.mu+=mu
+            stat.omega+=omega
+
+        # Compensate for the difference between
+        # the reference point and the sample means.
+        ind,=numpy.where(stat.omega>0.0)
+        stat.sigma[ind,:]-=numpy.abs(stat.mu[ind,:])**2/stat.omega[ind,numpy.newaxis]
+        stat.mu+=stat.omega[:,numpy.newaxis]*ref
+
+        return stat
+
+    def merge(self,stat,scale=None):
+
+        size=self.__size__
+        dim=self.__dim__
+
+        stat=list(stat)
+
+        if scale is None:
+            scale=[1.0]*len(stat)
+
+        assert len(scale)==len(stat)
+        assert all(isinstance(s,gaussgammabank.param) for s in stat)
+
+        merged=gaussgammabank.param()
+
+        # Initialize the merged
+        # sufficient statistics.
+        merged.mu=numpy.zeros([size,dim])
+        merged.omega=numpy.zeros(size)
+        merged.sigma=numpy.zeros([size,dim])
+        merged.eta=numpy.zeros(size)
+
+        # Add the statistics, and their scatter about the origin, so that
+        # statistics gathered from different sets of data can be combined.
+        for c,s in zip(scale,stat):
+
+            merged.mu+=c*s.mu
+            merged.omega+=c*s.omega
+            merged.sigma+=c*s.sigma
+            merged.eta+=c*s.eta
+
+            ind,=numpy.where(s.omega>0.0)
+            merged.sigma[ind]+=c*numpy.abs(s.mu[ind,:])**2/s.omega[ind,numpy.newaxis]
+
+        # Compensate for the difference between
+        # the origin and the merged sample means.
+        ind,=numpy.where(merged.omega>0.0)
+        merged.sigma[ind]-=numpy.abs(merged.mu[ind,:])**2/merged.omega[ind,numpy.newaxis]
+
+        return merged
+
+    def fold(self,stat,mat):
+
+        assert isinstance(stat,gaussgammabank.param) and numpy.shape(mat)[0]==self.__size__
+
+        # Add the scatter of the statistics about the origin.
+        sigma=numpy.copy(stat.sigma)
+        ind,=numpy.where(stat.omega>0.0)
+        sigma[ind]+=numpy.abs(stat.mu[ind,:])**2/stat.omega[ind,numpy.newaxis]
+
+        folded=gaussgammabank.param()
+
+        # Add the statistics of the components which are mapped onto the
+        # same column of the matrix, dropping those of the empty rows.
+        folded.mu=numpy.dot(mat.transpose(),stat.mu)
+        folded.omega=numpy.dot(mat.transpose(),stat.omega)
+        folded.sigma=numpy.tensordot(mat,sigma,axes=(0,0))
+        folded.eta=numpy.dot(mat.transpose(),stat.eta)
+
+        # Compensate for the difference between
+        # the origin and the folded sample means.
+        ind,=numpy.where(folded.omega>0.0)
+        folded.sigma[ind]-=numpy.abs(folded.mu[ind,:])**2/folded.omega[ind,numpy.newaxis]
+
+        return folded
+
+    def update(self,stat):
+
+        size=self.__size__
+        dim=self.__dim__
+
+        assert isinstance(stat,gaussgammabank.param) and numpy.shape(stat.mu)==(size,dim)\
+               and numpy.shape(stat.sigma)==(size,dim)
+
+        mu=self.__param__.mu
+        omega=self.__param__.omega
+        sigma=self.__param__.sigma
+        eta=self.__param__.eta
+
+        diff=numpy.copy(mu)
+        ind,=numpy.where(stat.omega>0.0)
+        diff[ind,:]-=stat.mu[ind,:]/stat.omega[ind,numpy.newaxis]
+
+        weight=numpy.copy(stat.omega)
+
+        # Update the parameters of the conditional Gauss distributions to
+        # reflect the information gained from the data, except for those
+        # which are singular.
+        ind,=numpy.where(numpy.isfinite(omega))
+        weight[ind]=(omega[ind]*stat.omega[ind])/(omega[ind]+stat.omega[ind])
+        mu[ind,:]=omega[ind,numpy.newaxis]*mu[ind,:]+stat.mu[ind,:]
+        omega[ind]+=stat.omega[ind]
+        mu[ind,:]/=omega[ind,numpy.newaxis]
+
+        # Update the parameters of the marginal Gamma distributions to
+        # reflect the information gained from the data, except for those
+        # which are singular.
+        ind,=numpy.where(numpy.isfinite(eta))
+        sigma[ind,:]=eta[ind,numpy.newaxis]*sigma[ind,:]+stat.sigma[ind,:]\
+            +weight[ind,numpy.newaxis]*numpy.abs(diff[ind,:])**2
+        eta[ind]+=stat.eta[ind]
+        sigma[ind,:]/=eta[ind,numpy.newaxis]
+
+        self.__cache__=None
+
+        return self
+
+class gausswishbank(object):
+
+    # Define a structure-like container
+    # class for storing the stacked
+    # parameters of a bank of Gauss-Wishart
+    # distributions.
+    class param:
+        mu=None
+        omega=None
+        sigma=None
+        eta=None
+
+    # Define a container for the residuals
+    # of a set of observations about their
+    # mean, and their outer products, which
+    # are packed by the upper triangles.
+    class summary:
+        ref=None
+        resid=None
+        outer=None
+
+        @property
+        def nbytes(self):
+            return self.resid.nbytes+self.outer.nbytes
+
+    def __init__(self,size,dim,mu=None,omega=None,sigma=None,eta=None,dtype=numpy.float64,threads=1):
+
+        assert size>0 and dim>0 and threads>0
+
+        # Define default values
+        # for the parameters.
+        if mu is None:
+            mu=numpy.zeros(dim)
+        if omega is None:
+            omega=1.0
+        if sigma is None:
+            sigma=numpy.eye(dim)
+        if eta is None:
+            eta=float(dim)
+
+        self.__size__=size
+        self.__dim__=dim
+        self.__dtype__=numpy.dtype(dtype)
+        self.__threads__=threads
+        self.__param__=gausswishbank.param()
+
+        # Initialize the parameters, so that every
+        # distribution in the bank is identical.
+        self.__param__.mu=numpy.zeros([size,dim])
+        self.__param__.omega=numpy.zeros(size)
+        self.__param__.sigma=numpy.zeros([size,dim,dim])
+        self.__param__.eta=numpy.zeros(size)
+
+        self.__param__.mu[:]=mu
+        self.__param__.omega[:]=omega
+        self.__param__.sigma[:]=sigma
+        self.__param__.eta[:]=eta
+
+        self.__cache__=None
+
+        return
+
+    def __len__(self):
+        return self.__size__
+
+    def __getitem__(self,index):
+
+        assert -self.__size__<=index<self.__size__
+
+        # Create a distribution whose
+        # parameters are views into
+        # the stacked arrays.
+        dist=gausswish.__new__(gausswish)
+        dist.__dim__=self.__dim__
+        dist.__param__=bankview(self,index%self.__size__)
+
+        return dist
+
+    def __iter__(self):
+        return (self[k] for k in range(self.__size__))
+
+    @property
+    def size(self):
+        return self.__size__
+
+    @property
+    def dim(self):
+        return self.__dim__
+
+    @property
+    def dtype(self):
+        return self.__dtype__
+
+    @property
+    def threads(self):
+        return self.__threads__
+
+    @property
+    def cache(self):
+        return self.__cache__ if self.__cache__ is not None else self.__precomp__()
+
+    @property
+    def mu(self):
+        return self.__param__.mu
+
+    @mu.setter
+    def mu(self,mu):
+        self.__param__.mu[:]=mu
+        self.__cache__=None
+
+    @property
+    def omega(self):
+        return self.__param__.omega
+
+    @omega.setter
+    def omega(self,omega):
+        self.__param__.omega[:]=omega
+        self.__cache__=None
+
+    @property
+    def sigma(self):
+        return self.__param__.sigma
+
+    @sigma.setter
+    def sigma(self,sigma):
+        self.__param__.sigma[:]=sigma
+        self.__cache__=None
+
+    @property
+    def eta(self):
+        return self.__param__.eta
+
+    @eta.setter
+    def eta(self,eta):
+        self.__param__.eta[:]=eta
+        self.__cache__=None
+
+    def copy(self,other):
+
+        assert len(other)==self.__size__
+
+        if isinstance(other,gausswishbank):
+
+            assert other.__dim__==self.__dim__
+
+            # Copy the stacked parameters of the
+            # posterior distributions from the
+            # prior distributions.
+            self.__param__.mu[:]=other.__param__.mu
+            self.__param__.omega[:]=other.__param__.omega
+            self.__param__.sigma[:]=other.__param__.sigma
+            self.__param__.eta[:]=other.__param__.eta
+
+        else:
+
+            assert all(isinstance(d,gausswish) and d.dim==self.__dim__ for d in other)
+
+            # Stack the parameters of the distributions.
+            for k,d in enumerate(other):
+                self.__param__.mu[k,:]=d.mu
+                self.__param__.omega[k]=d.omega
+                self.__param__.sigma[k,:,:]=d.sigma
+                self.__param__.eta[k]=d.eta
+
+        self.__cache__=None
+
+        return self
+
+    def take(self,index):
+
+        param=self.__param__
+
+        # Copy the selected distributions into another bank.
+        return gausswishbank(len(index),self.__dim__,mu=param.mu[index],omega=param.omega[index],
+                            sigma=param.sigma[index],eta=param.eta[index],dtype=self.__dtype__,
+                            threads=self.__threads__)
+
+    def summarize(self,obs):
+
+        assert numpy.ndim(obs)==2
+        dim,numpoint=numpy.shape(obs)
+        assert dim==self.__dim__
+
+        # The summaries are kept in double precision, like
+        # the products which are formed by stat.
+        obs=numpy.asarray(obs,dtype=numpy.float64)
+
+        summary=gausswishbank.summary()
+
+        # Take the residuals about the mean of the observations, so that
+        # their packed outer products can be reduced by each call of stat
+        # instead of being recomputed.
+        summary.ref=obs.mean(axis=1,dtype=numpy.float64) if numpoint>0 else numpy.zeros(dim)
+        summary.resid=obs-summary.ref[:,numpy.newaxis]
+        row,col=numpy.triu_indices(dim)
+        summary.outer=summary.resid[row,:]*summary.resid[col,:]
+
+        return summary
+
+    def summarysize(self,numpoint):
+
+        dim=self.__dim__
+
+        # Count the bytes of the residuals and their
+        # packed outer products without building them.
+        return (dim+dim*(dim+1)//2)*numpoint*numpy.dtype(numpy.float64).itemsize
+
+    def __precomp__(self):
+
+        dim=self.__dim__
+
+        mu=self.__param__.mu
+        omega=self.__param__.omega
+        sigma=self.__param__.sigma
+        eta=self.__param__.eta
+
+        cache=gausswishbank.param()
+
+        # Factorize all the scale matrices at once, and compute half of
+        # their log-determinants and the digamma terms of the expected
+        # log-determinants. These are kept until the parameters change.
+        cache.fact=linalg.cholesky(sigma)
+        cache.logdet=numpy.log(numpy.diagonal(cache.fact,axis1=1,axis2=2)).sum(axis=1)
+        cache.psi=numpy.zeros(self.__size__)
+        cache.psi[:]=numpy.nan
+        ind,=numpy.where(numpy.isfinite(eta))
+        cache.psi[ind]=special.psi((eta[ind,numpy.newaxis]-numpy.arange(dim))/2.0).sum(axis=1)
+
+        # Store the inverse factors, so that the observations
+        # can be whitened by a single batched matrix product.
+        cache.white=numpy.array([solve_triangular(f,numpy.eye(dim),lower=True) for f in cache.fact])
+        cache.shift=numpy.matmul(cache.white,mu[:,:,numpy.newaxis])
+        cache.const=dim/omega
+
+        # Compute half of the expected log-determinants.
+        cache.expdet=numpy.copy(cache.logdet)
+        cache.expdet[ind]+=(dim/2.0)*numpy.log(eta[ind]/2.0)-cache.psi[ind]/2.0
+
+        self.__cache__=cache
+
+        return cache
+
+    def rand(self):
+
+        size=self.__size__
+        dim=self.__dim__
+
+        mu=self.__param__.mu
+        omega=self.__param__.omega
+        sigma=self.__param__.sigma
+        eta=self.__param__.eta
+
+        disp=numpy.copy(sigma)
+        loc=numpy.copy(mu)
+
+        # Simulate the marginal Wishart distributions, except
+        # for those which are singular.
+        ind,=numpy.where(numpy.isfinite(eta))
+        if len(ind)>0:
+            diag=2.0*random.gamma((eta[ind,numpy.newaxis]-numpy.arange(dim))/2.0)
+            fact=diag[:,:,numpy.newaxis]*numpy.eye(dim)
+            fact=numpy.sqrt(fact)+numpy.tril(random.randn(len(ind),dim,dim),-1)
+            fact=linalg.solve(fact,numpy.sqrt(eta[ind,numpy.newaxis,numpy.newaxis])
+                              *self.cache.fact[ind,:,:].transpose([0,2,1]))
+            disp[ind,:,:]=numpy.matmul(fact.transpose([0,2,1]),fact)
+
+        # Simulate the conditional Gauss distributions, except
+        # for those which are singular.
+        ind,=numpy.where(numpy.isfinite(omega))
+        if len(ind)>0:
+            loc[ind,:]+=numpy.matmul(linalg.cholesky(disp[ind,:,:]),
+                                     random.randn(len(ind),dim,1))[:,:,0]\
+                /numpy.sqrt(omega[ind,numpy.newaxis])
+
+        return loc,disp
+
+    def loglik(self,obs,nu=None,index=None):
+
+        dim,size=numpy.shape(obs)
+
+        numblock=min(self.__threads__,size//1024)
+
+        if numblock<2:
+            return self.__loglik__(obs,nu=nu,index=index)
+
+        # Compute the cache once, rather than in each thread.
+        if self.__cache__ is None:
+            self.__precomp__()
+
+        split=numpy.linspace(0,size,numblock+1).astype(int)
+
+        def block(s):
+            return self.__loglik__(obs[:,s],nu=nu,index=index[:,s] if index is not None else None)
+
+        # Evaluate blocks of the observations by a pool of threads. The
+        # products release the interpreter, so the blocks run concurrently.
+        val=execute(self.__threads__,block,[slice(i,j) for i,j in zip(split[:-1],split[1:])])
+
+        if nu is None:
+            return numpy.concatenate(val,axis=1)
+
+        return tuple(numpy.concatenate(v,axis=1) for v in zip(*val))
+
+    def __loglik__(self,obs,nu=None,index=None):
+
+        assert numpy.ndim(obs)==2
+        dim,size=numpy.shape(obs)
+        assert dim==self.__dim__
+
+        dtype=self.__dtype__
+
+        # The parameters are kept in double precision, but the observations
+        # and the quantities of each observation are in the precision of
+        # the bank.
+        obs=numpy.asarray(obs,dtype=dtype)
+
+        cache=self.cache
+
+        if index is None:
+
+            # Compute the expected squared errors
+            # of all the components at once.
+            sqerr=(numpy.abs(numpy.matmul(cache.white.astype(dtype),obs)-cache.shift.astype(dtype))**2).sum(axis=1)
+            sqerr+=cache.const.astype(dtype)[:,numpy.newaxis]
+
+            logdet=cache.expdet.astype(dtype)[:,numpy.newaxis]
+
+        else:
+
+            white=cache.white.astype(dtype)
+            shift=cache.shift.astype(dtype)
+
+            numcand=numpy.shape(index)[0]
+
+            sqerr=numpy.zeros([numcand,size],dtype=dtype)
+
+            # Only compute the expected squared errors of the components which
+            # are selected for each observation. Their inverse factors are
+            # gathered for blocks of observations, which bound the size of the
+            # copies, and whiten the observations by a batched product.
+            step=max(2**18//(numcand*dim*dim),1)
+
+            for i in range(0,size,step):
+                ind=index[:,i:i+step]
+                x=obs[:,i:i+step].transpose()[numpy.newaxis,:,:,numpy.newaxis]
+                sqerr[:,i:i+step]=(numpy.abs(numpy.matmul(white[ind,:,:],x)-shift[ind,:,:])**2).sum(axis=(2,3))
+
+            sqerr+=cache.const.astype(dtype)[index]
+
+            logdet=cache.expdet.astype(dtype)[index]
+
+        if nu is None:
+
+            # Evaluate the expected log-likelihood of the observations.
+            return -(dim/2.0)*math.log(2.0*math.pi)-logdet-sqerr/2.0
+
+        elif numpy.isinf(nu):
+
+            # Evaluate the expected log-likelihood of the observations, and the mixing weights.
+            return -(dim/2.0)*math.log(2.0*math.pi)-logdet-sqerr/2.0,numpy.ones_like(sqerr)
+
+        else:
+
+            const=special.gammaln(nu/2.0)-special.gammaln((nu+dim)/2.0)\
+                +(dim/2.0)*math.log(math.pi*nu)+logdet
+
+            const=const.astype(dtype)
+            nu=dtype.type(nu)
+
+            # Evaluate the expected log-likelihood of the observations, and the
+            # expected value of the posterior distribution over mixing weights.
+            return -const-((nu+dim)/2.0)*numpy.log1p(sqerr/nu),(nu+dim)/(nu+sqerr)
+
+    def div(self,other,index=None):
+
+        assert isinstance(other,gausswishbank) and other.__dim__==self.__dim__
+
+        # Pair the distributions of the banks one to one, unless
+        # the pairs of the indices of the distributions are given.
+        if index is None:
+            assert other.__size__==self.__size__
+            index=numpy.arange(self.__size__),numpy.arange(self.__size__)
+
+        left,right=index
+
+        dim=self.__dim__
+
+        post=self.__param__
+        prior=other.__param__
+
+        div=numpy.zeros(len(left))
+
+        # Only evaluate the divergences between non-singular
+        # distributions in bulk. Defer to the individual
+        # distributions to handle the special cases.
+        fin=numpy.isfinite(post.omega[left])&numpy.isfinite(prior.omega[right])\
+            &numpy.isfinite(post.eta[left])&numpy.isfinite(prior.eta[right])
+
+        ind,=numpy.where(fin)
+
+        postind=left[ind]
+        priorind=right[ind]
+
+        # Reuse the factors of the scale matrices, and the
+        # inverse factors of those of the posterior distributions.
+        postcache=self.cache
+        priorcache=other.cache
+
+        white=postcache.white[postind,:,:]
+
+        # Compute the expected divergences between the posterior
+        # and the prior conditional Gauss distributions.
+        ratio=prior.omega[priorind]/post.omega[postind]
+        div[ind]=(dim/2.0)*(ratio-numpy.log(ratio)-1.0)\
+            +(prior.omega[priorind]/2.0)*(numpy.abs(numpy.matmul(white,(post.mu[postind,:]-prior.mu[priorind,:])
+                                                                 [:,:,numpy.newaxis]))**2).sum(axis=(1,2))
+
+        # Select half of the log-determinants.
+        postdet=postcache.logdet[postind]
+        priordet=priorcache.logdet[priorind]
+
+        posteta=post.eta[postind]
+        prioreta=prior.eta[priorind]
+
+        aux=(dim/2.0)*numpy.log(posteta/2.0)-postcache.psi[postind]/2.0
+
+        # Add the divergences between the posterior and
+        # the prior marginal Wishart distributions.
+        div[ind]+=-(posteta/2.0)*dim\
+            +(prioreta/2.0)*(numpy.abs(numpy.matmul(white,priorcache.fact[priorind,:,:]))**2).sum(axis=(1,2))\
+            +(prioreta-posteta)*(postdet+aux)-prioreta*priordet+posteta*postdet\
+            +special.gammaln((prioreta[:,numpy.newaxis]-numpy.arange(dim))/2.0).sum(axis=1)\
+            -special.gammaln((posteta[:,numpy.newaxis]-numpy.arange(dim))/2.0).sum(axis=1)\
+            -dim*(prioreta/2.0)*numpy.log(prioreta/2.0)\
+            +dim*(posteta/2.0)*numpy.log(posteta/2.0)
+
+        for k in numpy.where(~fin)[0]:
+            div[k]=self[left[k]].div(other[right[k]])
+
+        return div
+
+    def stat(self,evidence,weighted=False,scaled=False):
+
+        threads=self.__threads__
+
+        if threads<2:
+            return self.__stat__(evidence,weighted=weighted,scaled=scaled)
+
+        block=[]
+
+        # Split the evidence into blocks of the observations.
+        for item in evidence:
+
+            obs=item[0] if isinstance(item,tuple) else item
+
+            # Summaries are
+            # not split.
+            if isinstance(obs,gausswishbank.summary):
+                block.append(item)
+                continue
+
+            size=numpy.shape(obs)[1]
+            split=numpy.linspace(0,size,max(min(threads,size//1024),1)+1).astype(int)
+
+            for i,j in zip(split[:-1],split[1:]):
+                if isinstance(item,tuple):
+                    block.append(tuple(x[:,i:j] if x is not None else None for x in item))
+                else:
+                    block.append(item[:,i:j])
+
+        # Accumulate the statistics of the blocks by a pool of threads, each
+        # of which takes every few blocks, and merge them.
+        stat=execute(threads,lambda part:self.__stat__(part,weighted=weighted,scaled=scaled),
+                     [block[t::threads] for t in range(min(threads,len(block)))])
+
+        return self.merge(stat) if len(stat)>0 else self.__stat__([],weighted=weighted,scaled=scaled)
+
+    def __stat__(self,evidence,weighted=False,scaled=False):
+
+        size=self.__size__
+        dim=self.__dim__
+
+        stat=gausswishbank.param()
+
+        # Initialize the expected
+        # sufficient statistics.
+        stat.mu=numpy.zeros([size,dim])
+        stat.omega=numpy.zeros(size)
+        stat.sigma=numpy.zeros([size,dim,dim])
+        stat.eta=numpy.zeros(size)
+
+        # Accumulate the moments about a reference point which is common
+        # to all the components, so that each set of data is traversed
+        # once, regardless of the number of components.
+        ref=self.__param__.mu.mean(axis=0)
+
+        # The products are formed in double precision, whatever the
+        # precision of the bank, since the moments about the reference
+        # point cancel when they are centred on the sample means.
+        dtype=numpy.float64
+
+        # Enumerate the entries in the upper triangles of the scatter
+        # matrices, so that the outer products are stored packed.
+        row,col=numpy.triu_indices(dim)
+
+        outer=numpy.zeros([size,len(row)])
+
+        # Accumulate the expected
+        # sufficient statistics.
+        for item in evidence:
+
+            if weighted and scaled:
+                obs,weight,scale=item
+            elif weighted:
+                obs,weight=item
+                scale=None
+            elif scaled:
+                obs,scale=item
+                weight=None
+            else:
+                obs=item
+                weight=scale=None
+
+            # A summary holds the residuals about its own reference
+            # point, which are shifted to the common one once they
+            # have been reduced.
+            if isinstance(obs,gausswishbank.summary):
+                resid,prod,shift=obs.resid,obs.outer,obs.ref-ref
+            else:
+                assert numpy.ndim(obs)==2
+
+                resid=numpy.asarray(obs,dtype=dtype)-ref[:,numpy.newaxis]
+                prod=shift=None
+
+            dim,numpoint=numpy.shape(resid)
+            assert dim==self.__dim__
+
+            # Check that the sizes match.
+            if weight is None:
+                weight=numpy.ones([size,numpoint],dtype=dtype)
+            else:
+                assert numpy.shape(weight)==(size,numpoint)
+            if scale is None:
+                scale=numpy.ones([size,numpoint],dtype=dtype)
+            else:
+                assert numpy.shape(scale)==(size,numpoint)
+
+            # Sparse scales only accumulate the statistics of their nonzero
+            # entries. Sparse weights which share the structure of the scales
+            # are multiplied by their stored entries.
+            if sparse.issparse(scale) and sparse.issparse(weight) and scale.format==weight.format in ('csr','csc')\
+               and numpy.array_equal(scale.indptr,weight.indptr) and numpy.array_equal(scale.indices,weight.indices):
+                weight=type(scale)((numpy.multiply(weight.data,scale.data,dtype=dtype),scale.indices,scale.indptr),
+                                   shape=scale.shape)
+            elif sparse.issparse(scale):
+                weight=scale.multiply(weight).astype(dtype).tocsr()
+            else:
+                weight=numpy.multiply(weight,scale,dtype=dtype)
+
+            # Update the statistics of the conditional Gauss distributions.
+            mu=weight.dot(resid.transpose())
+            omega=weight.sum(axis=1,dtype=numpy.float64)
+
+            # Update the statistics of the marginal Wishart distributions
+            # by reducing the packed outer products of the residuals, which
+            # are either those of a summary, or are formed for blocks of
+            # observations, which bound the size of the products. Only a
+            # few components reduce the weighted residuals one by one.
+            if prod is not None:
+                outer+=weight.dot(prod.transpose())
+            elif size<dim:
+                if sparse.issparse(weight):
+                    weight=weight.tocsr()
+                    for k,i,j in zip(range(size),weight.indptr[:-1],weight.indptr[1:]):
+                        x=resid[:,weight.indices[i:j]]
+                        outer[k,:]+=numpy.dot(x*weight.data[i:j],x.transpose())[row,col]
+                else:
+                    for k in range(size):
+                        outer[k,:]+=numpy.dot(resid*weight[k,:],resid.transpose())[row,col]
+            else:
+                if sparse.issparse(weight):
+                    weight=weight.tocsc()
+                step=max(2**20//len(row),1)
+                for i in range(0,numpoint,step):
+                    x=resid[:,i:i+step]
+                    outer+=weight[:,i:i+step].dot((x[row,:]*x[col,:]).transpose())
+
+            stat.eta+=scale.sum(axis=1,dtype=numpy.float64)
+
+            if shift is not None:
+                outer+=mu[:,row]*shift[col]+mu[:,col]*shift[row]+omega[:,numpy.newaxis]*shift[row]*shift[col]
+                mu=mu+omega[:,numpy.newaxis]*shift
+
+            stat.mu+=mu
+            stat.omega+=omega
+
+        stat.sigma[:,row,col]=outer
+        stat.sigma[:,col,row]=outer
+
+        # Compensate for the difference between
+        # the reference point and the sample means.
+        ind,=numpy.where(stat.omega>0.0)
+        stat.sigma[ind,:,:]-=stat.mu[ind,:,numpy.newaxis]*stat.mu[ind,numpy.newaxis,:]\
+            /stat.omega[ind,numpy.newaxis,numpy.newaxis]
+        stat.mu+=stat.omega[:,numpy.newaxis]*ref
+
+        return stat
+
+    def merge(self,stat,scale=None):
+
+        size=self.__size__
+        dim=self.__dim__
+
+        stat=list(stat)
+
+        if scale is None:
+            scale=[1.0]*len(stat)
+
+        assert len(scale)==len(stat)
+        assert all(isinstance(s,gausswishbank.param) for s in stat)
+
+        merged=gausswishbank.param()
+
+        # Initialize the merged
+        # sufficient statistics.
+        merged.mu=numpy.zeros([size,dim])
+        merged.omega=numpy.zeros(size)
+        merged.sigma=numpy.zeros([size,dim,dim])
+        merged.eta=numpy.zeros(size)
+
+        # Add the statistics, and their scatter about the origin, so that
+        # statistics gathered from different sets of data can be combined.
+        for c,s in zip(scale,stat):
+
+            merged.mu+=c*s.mu
+            merged.omega+=c*s.omega
+            merged.sigma+=c*s.sigma
+            merged.eta+=c*s.eta
+
+            ind,=numpy.where(s.omega>0.0)
+            merged.sigma[ind]+=c*s.mu[ind,:,numpy.newaxis]*s.mu[ind,numpy.newaxis,:]\
+                /s.omega[ind,numpy.newaxis,numpy.newaxis]
+
+        # Compensate for the difference between
+        # the origin and the merged sample means.
+        ind,=numpy.where(merged.omega>0.0)
+        merged.sigma[ind]-=merged.mu[ind,:,numpy.newaxis]*merged.mu[ind,numpy.newaxis,:]\
+            /merged.omega[ind,numpy.newaxis,numpy.newaxis]
+
+        return merged
+
+    def fold(self,stat,mat):
+
+        assert isinstance(stat,gausswishbank.param) and numpy.shape(mat)[0]==self.__size__
+
+        # Add the scatter of the statistics about the origin.
+        sigma=numpy.copy(stat.sigma)
+        ind,=numpy.where(stat.omega>0.0)
+        sigma[ind]+=stat.mu[ind,:,numpy.newaxis]*stat.mu[ind,numpy.newaxis,:]\
+            /stat.omega[ind,numpy.newaxis,numpy.newaxis]
+
+        folded=gausswishbank.param()
+
+        # Add the statistics of the components which are mapped onto the
+        # same column of the matrix, dropping those of the empty rows.
+        folded.mu=numpy.dot(mat.transpose(),stat.mu)
+        folded.omega=numpy.dot(mat.transpose(),stat.omega)
+        folded.sigma=numpy.tensordot(mat,sigma,axes=(0,0))
+        folded.eta=numpy.dot(mat.transpose(),stat.eta)
+
+        # Compensate for the difference between
+        # the origin and the folded sample means.
+        ind,=numpy.where(folded.omega>0.0)
+        folded.sigma[ind]-=folded.mu[ind,:,numpy.newaxis]*folded.mu[ind,numpy.newaxis,:]\
+            /folded.omega[ind,numpy.newaxis,numpy.newaxis]
+
+        return folded
+
+    def update(self,stat):
+
+        size=self.__size__
+        dim=self.__dim__
+
+        assert isinstance(stat,gausswishbank.param) and numpy.shape(stat.mu)==(size,dim)\
+               and numpy.shape(stat.sigma)==(size,dim,dim)
+
+        mu=self.__param__.mu
+        omega=self.__param__.omega
+        sigma=self.__param__.sigma
+        eta=self.__param__.eta
+
+        diff=numpy.copy(mu)
+        ind,=numpy.where(stat.omega>0.0)
+        diff[ind,:]-=stat.mu[ind,:]/stat.omega[ind,numpy.newaxis]
+
+        weight=numpy.copy(stat.omega)
+
+        # Update the parameters of the conditional Gauss distributions to
+        # reflect the information gained from the data, except for those
+        # which are singular.
+        ind,=numpy.where(numpy.isfinite(omega))
+        weight[ind]=(omega[ind]*stat.omega[ind])/(omega[ind]+stat.omega[ind])
+        mu[ind,:]=omega[ind,numpy.newaxis]*mu[ind,:]+stat.mu[ind,:]
+        omega[ind]+=stat.omega[ind]
+        mu[ind,:]/=omega[ind,numpy.newaxis]
+
+        # Update the parameters of the marginal Wishart distributions to
+        # reflect the information gained from the data, except for those
+        # which are singular.
+        ind,=numpy.where(numpy.isfinite(eta))
+        sigma[ind,:,:]=eta[ind,numpy.newaxis,numpy.newaxis]*sigma[ind,:,:]+stat.sigma[ind,:,:]\
+            +weight[ind,numpy.newaxis,numpy.newaxis]*diff[ind,:,numpy.newaxis]*diff[ind,numpy.newaxis,:]
+        eta[ind]+=stat.eta[ind]
+        sigma[ind,:,:]/=eta[ind,numpy.newaxis,numpy.newaxis]
+
+        sigma[:]=sigma/2.0+(sigma/2.0).transpose([0,2,1])
+
+        self.__cache__=None
 
         return self
@@ -0,0 +1,693 @@
+
+import math,numpy
+
+from numpy import linalg,random
+from scipy import sparse
+from scipy.spatial import cKDTree
+
+# Import the module-specific classes and functions.
+from __corpus__ import chunks,corpus
+from __dist__ import dirich,dirichbank
+from __util__ import isconv,lap,sqdist,unique
+
+def join(obs):
+
+    # The sets of a corpus are already contiguous.
+    if isinstance(obs,corpus):
+        return obs.data
+
+    return numpy.concatenate(obs,axis=1)
+
+def logsumexp(loglik):
+
+    maxval=loglik.max(axis=0)
+
+    # Only the normalization constants are accumulated in double
+    # precision, since the exponentials are bounded by one.
+    prob=numpy.exp(loglik-maxval[numpy.newaxis,:])
+    total=prob.sum(axis=0,dtype=numpy.float64)
+
+    # Normalize to obtain the probabilities
+    # of the components given the observations.
+    prob/=total.astype(prob.dtype)[numpy.newaxis,:]
+
+    return maxval.astype(numpy.float64)+numpy.log(total),prob
+
+def divsum(prior,post):
+
+    if len(post)==0:
+        return 0.0
+
+    dim=post[0].dim
+
+    # Stack the distributions, so that their divergences are evaluated
+    # at once. A bank of prior distributions is used as it is.
+    if not isinstance(prior,dirichbank):
+        prior=dirichbank(len(prior),dim).copy(prior)
+
+    return dirichbank(len(post),dim).copy(post).div(prior).sum()
+
+def perturb(prob,noisetemp,axis=0):
+
+    size=numpy.shape(prob)[axis]
+
+    # Add a bit of noise in order to break ties.
+    prob*=1.0-noisetemp*random.rand(*numpy.shape(prob))
+    prob/=prob.sum(axis=axis,keepdims=True)
+
+    prob[numpy.logical_or(numpy.isnan(prob),numpy.isinf(prob))]=1.0/size
+
+    return prob
+
+def compact(dist,mat):
+
+    # Compact each distribution of a list.
+    if isinstance(dist,list):
+        return [compact(d,mat) for d in dist]
+
+    dim=numpy.shape(mat)[1]
+
+    # Add the concentrations of the dimensions which are mapped onto the
+    # same column of the matrix, and drop those of the empty rows.
+    pi=numpy.dot(dist.pi,mat)
+    total=pi.sum(axis=-1)
+    pi/=numpy.expand_dims(total,-1)
+
+    if isinstance(dist,dirichbank):
+        return dirichbank(len(dist),dim,pi=pi,alpha=dist.alpha*total)
+
+    return dirich(dim,pi=pi,alpha=float(dist.alpha*total))
+
+def compactlocal(local,groupmat,compmat):
+
+    prob,weight,cond=local
+
+    for j,(r,w,c) in enumerate(zip(prob,weight,cond)):
+
+        # Only the sets of the last subset are
+        # available for the stochastic updates.
+        if r is None:
+            continue
+
+        mass=r.sum(axis=1,dtype=numpy.float64)
+        index=compmat.argmax(axis=0)
+
+        # Add the probabilities of the components which are folded
+        # together, and average their weights and the probabilities
+        # of the groups given the components accordingly.
+        if sparse.issparse(r):
+
+            numcomp,numpoint=r.shape
+
+            # Map the entries of the sparse probabilities, which share
+            # their structure with the weights, onto the columns of the
+            # matrix, and add the duplicates.
+            target=numpy.where(compmat.any(axis=1),compmat.argmax(axis=1),-1)[r.indices]
+            col=numpy.repeat(numpy.arange(numpoint),numpy.diff(r.indptr))
+            ind,=numpy.where(target>=0)
+
+            shape=(numpy.shape(compmat)[1],numpoint)
+
+            prob[j]=sparse.csc_array((r.data[ind],(target[ind],col[ind])),shape=shape)
+            total=sparse.csc_array((w.data[ind]*r.data[ind],(target[ind],col[ind])),shape=shape)
+            weight[j]=sparse.csc_array((numpy.divide(total.data,prob[j].data,out=numpy.ones_like(total.data),
+                                                     where=prob[j].data>0.0),
+                                        total.indices,total.indptr),shape=shape)
+
+        else:
+            prob[j]=numpy.dot(compmat.transpose(),r).astype(r.dtype)
+            weight[j]=numpy.divide(numpy.dot(compmat.transpose(),w*r),prob[j],
+                                   out=w[index,:].astype(numpy.float64),where=prob[j]>0.0).astype(w.dtype)
+
+        joint=numpy.dot(groupmat.transpose(),numpy.dot(c*mass[numpy.newaxis,:],compmat))
+        marg=joint.sum(axis=0)
+        cond[j]=numpy.divide(joint,marg,out=numpy.zeros_like(joint),where=marg>0.0)
+
+    return prob,weight,cond
+
+def tally(prob,cond,offset):
+
+    numsamp,numgroup,numcomp=numpy.shape(cond)
+
+    count=numpy.zeros([numsamp,numcomp])
+
+    # Sum the probabilities of the components over the observations of
+    # each set, taking care of the sets which have no observations.
+    if offset[-1]>0:
+        count[:]=numpy.add.reduceat(prob,numpy.minimum(offset[:-1],offset[-1]-1),axis=1,
+                                    dtype=numpy.float64).transpose()
+        count[numpy.diff(offset)==0,:]=0.0
+
+    # Compute the expected number of observations
+    # allocated to each group and component.
+    return cond*count[:,numpy.newaxis,:]
+
+def normalize(loglik,emiss,samp,noisetemp=None,index=None):
+
+    numgroup,numcomp=numpy.shape(emiss)
+
+    # Compute the joint log-probabilities of the groups and the
+    # components. These do not depend on the observations, so the
+    # groups can be marginalized out before the observations are
+    # considered, leaving the probabilities of the groups given the
+    # components.
+    joint=samp.loglik()[:,numpy.newaxis]+emiss
+
+    const=joint.max()
+    cond=numpy.exp(joint-const)
+    marg=cond.sum(axis=0)
+    cond=numpy.divide(cond,marg,out=numpy.zeros([numgroup,numcomp]),where=marg>0.0)
+
+    # Only the components which are selected for each
+    # observation are normalized, if they are given.
+    with numpy.errstate(divide='ignore'):
+        if index is None:
+            loglik=loglik+(numpy.log(marg)[:,numpy.newaxis]+const).astype(loglik.dtype)
+        else:
+            loglik=loglik+(numpy.log(marg)+const).astype(loglik.dtype)[index]
+
+    logconst,prob=logsumexp(loglik)
+
+    if noisetemp is not None:
+        prob=perturb(prob,noisetemp)
+        cond=perturb(cond,noisetemp)
+
+    return logconst,prob,cond
+
+def candidates(comp,obs,numcand):
+
+    dtype=comp.dtype
+
+    # Select the components whose means are the nearest to
+    # each observation, so that the others are not evaluated.
+    dist=sqdist(numpy.asarray(obs,dtype=dtype),comp.mu.astype(dtype))
+
+    return numpy.argpartition(dist,numcand-1,axis=1)[:,:numcand].transpose()
+
+def nearindex(comp,emiss,nu=numpy.inf):
+
+    numgroup,numcomp=numpy.shape(emiss)
+
+    mu=comp.mu
+
+    # Bound the expected precision of each component from below by a
+    # multiple of the identity, so that the expected squared errors are
+    # bounded from below by the scaled squared distances between the
+    # observations and the means.
+    if numpy.ndim(comp.sigma)==3:
+        prec=1.0/linalg.eigvalsh(comp.sigma)[:,-1]
+    else:
+        prec=1.0/comp.sigma.max(axis=1)
+
+    # Bound the log-probabilities of the groups given the components, which
+    # differ between the sets, by their extremes over the groups. The
+    # largest expected log-likelihoods are those at the means.
+    peak=comp.loglik(mu.transpose(),nu=nu,index=numpy.arange(numcomp)[numpy.newaxis,:])[0][0,:]
+    peak=peak.astype(numpy.float64)+emiss.max(axis=0)
+
+    tier=[]
+
+    # Index the means of the components whose precisions are within a
+    # factor of two by a tree, scaled by their smallest precision.
+    for t,ind in unique(numpy.floor(numpy.log2(prec/prec.min())).astype(int)):
+        scale=math.sqrt(prec[ind].min())
+        tier.append((ind,scale,cKDTree(scale*mu[ind,:])))
+
+    # These do not depend on the observations, so they are
+    # built once for all the sets, along with a tree which
+    # indexes the means themselves.
+    return prec,peak,cKDTree(mu),tier
+
+def nearby(comp,emiss,obs,candtol,nu=numpy.inf,tree=None):
+
+    numgroup,numcomp=numpy.shape(emiss)
+
+    dim,numpoint=numpy.shape(obs)
+
+    if numpoint==0:
+        return numpy.zeros([1,0],dtype=int),numpy.ones([1,0],dtype=bool)
+
+    mu=comp.mu
+    omega=comp.omega
+
+    # Build the index of the components,
+    # unless it is shared by several calls.
+    if tree is None:
+        tree=nearindex(comp,emiss,nu=nu)
+
+    prec,peak,meantree,tier=tree
+
+    point=numpy.asarray(obs,dtype=numpy.float64).transpose()
+
+    # Bound the log-normalization constant of each observation
+    # from below by the term of the nearest component.
+    dist,near=meantree.query(point)
+
+    ref=comp.loglik(obs,nu=nu,index=near[numpy.newaxis,:])[0][0,:]
+    ref=ref.astype(numpy.float64)+emiss.min(axis=0)[near]
+
+    # Ignore the components whose terms are bounded by a fraction of the
+    # tolerance, relative to the bound of the log-normalization constant,
+    # so that all the ignored terms change the constant by less than the
+    # tolerance. Solve the bounds for the largest scaled distances.
+    thresh=ref+math.log(candtol/numcomp)
+
+    def radius(peak,omega,thresh):
+        if numpy.isinf(nu):
+            return 2.0*numpy.maximum(peak-thresh,0.0)
+        return (nu+dim/omega)*numpy.expm1(numpy.minimum(2.0*numpy.maximum(peak-thresh,0.0)/(nu+dim),700.0))
+
+    row,col=[],[]
+
+    # Query the balls of the tree of each tier of precisions, which hold
+    # the means of all the components that may matter, and check the
+    # bound of each component within them by its own precision. The
+    # components of a tier with few of them are all checked directly,
+    # for blocks of the observations, which is cheaper than querying
+    # the tree if most of them matter.
+    for ind,scale,sub in tier:
+
+        if len(ind)<=128:
+
+            for i in range(0,numpoint,4096):
+
+                dist=((point[i:i+4096,numpy.newaxis,:]-mu[numpy.newaxis,ind,:])**2).sum(axis=2)
+
+                keep=prec[ind]*dist<=radius(peak[ind],omega[ind],thresh[i:i+4096,numpy.newaxis])
+                keep|=ind==near[i:i+4096,numpy.newaxis]
+
+                c,r=numpy.nonzero(keep)
+
+                row.append(ind[r])
+                col.append(c+i)
+
+            continue
+
+        ball=sub.query_ball_point(scale*point,numpy.sqrt(radius(peak[ind].max(),omega[ind].min(),thresh)))
+
+        c=numpy.repeat(numpy.arange(numpoint),[len(b) for b in ball])
+        r=ind[numpy.concatenate(ball).astype(int)]
+
+        keep=prec[r]*((point[c,:]-mu[r,:])**2).sum(axis=1)<=radius(peak[r],omega[r],thresh[c])
+        keep|=r==near[c]
+
+        row.append(r[keep])
+        col.append(c[keep])
+
+    row=numpy.concatenate(row)
+    col=numpy.concatenate(col)
+
+    order=numpy.argsort(col,kind='stable')
+    row=row[order]
+    col=col[order]
+
+    size=numpy.bincount(col,minlength=numpoint)
+    offset=numpy.concatenate([[0],numpy.cumsum(size)])
+
+    # Stack the selected components of each observation, padded
+    # by the nearest component, and mark those which are selected.
+    index=numpy.tile(near,(size.max(),1))
+    valid=numpy.zeros(numpy.shape(index),dtype=bool)
+
+    pos=numpy.arange(len(col))-offset[col]
+    index[pos,col]=row
+    valid[pos,col]=True
+
+    return index,valid
+
+def sparsify(logconst,prob,weight,index,numcomp,topk=None,logtol=None):
+
+    numcand,numpoint=numpy.shape(prob)
+
+    # Keep the largest probabilities of each observation,
+    # and those within the tolerance of the largest, but
+    # not those which vanish.
+    keep=prob>0.0
+    if topk is not None and topk<numcand:
+        keep&=prob>=-numpy.partition(-prob,topk-1,axis=0)[topk-1,:]
+    if logtol is not None:
+        keep&=prob>=prob.max(axis=0)*math.exp(-logtol)
+
+    # Renormalize the remaining probabilities. The log-normalization
+    # constants of the truncated probabilities remain exact terms of
+    # the bound.
+    prob=numpy.where(keep,prob,0.0).astype(prob.dtype)
+    total=prob.sum(axis=0,dtype=numpy.float64)
+    prob/=total.astype(prob.dtype)[numpy.newaxis,:]
+
+    keep=keep.transpose()
+
+    # Store the remaining entries of each observation contiguously, i.e. in
+    # the compressed sparse row format of the transposed probabilities.
+    offset=numpy.concatenate([[0],numpy.cumsum(keep.sum(axis=1))])
+    row=index.transpose()[keep]
+
+    prob=sparse.csc_array((prob.transpose()[keep],row,offset),shape=(numcomp,numpoint))
+    weight=sparse.csc_array((weight.transpose()[keep],row,offset),shape=(numcomp,numpoint))
+
+    return logconst+numpy.log(total),prob,weight
+
+def estep(comp,emiss,samp,obs,nu=numpy.inf,noisetemp=None):
+
+    # Evaluate the expected log-likelihood
+    # of the observations, and the expected
+    # value of the weights.
+    loglik,weight=comp.loglik(obs,nu=nu)
+
+    logconst,prob,cond=normalize(loglik,emiss,samp,noisetemp=noisetemp)
+
+    return logconst,prob,weight,cond
+
+def sweep(comp,emiss,prior,post,obs,nu=numpy.inf,noisetemp=None,timer=None,evalbound=True,
+          topk=None,logtol=None,numcand=None,candtol=None,summary=None,cachesize=numpy.inf,keeplocal=True):
+
+    numgroup,numcomp=numpy.shape(emiss)
+
+    numsamp=len(obs)
+
+    bound=0.0
+
+    prob=[None]*numsamp
+    weight=[None]*numsamp
+    cond=[None]*numsamp
+    count=[None]*numsamp
+
+    # Reduce the statistics of each chunk of a corpus, or of as many
+    # sets as the default size of the chunks of a corpus, as soon as
+    # they are complete, so that only the local quantities of the
+    # latest chunk are held at once, unless they are kept.
+    chunksize=obs.chunksize if isinstance(obs,corpus) else 65536
+    buffered=0
+
+    # The sets of a corpus are contiguous, so the expected log-likelihoods
+    # are evaluated for chunks of sets at once, without copying the sets.
+    # The nearest components are also found for chunks of the sets of a
+    # list, which are copied into one array, so that the index of the
+    # components is queried for many observations at once.
+    if isinstance(obs,corpus):
+        span=list(obs.chunks())
+    elif candtol is not None:
+        span=list(chunks(numpy.concatenate([[0],numpy.cumsum([numpy.shape(x)[1] for x in obs])]),chunksize))
+    else:
+        span=[(j,j+1) for j in range(numsamp)]
+
+    evidence=[]
+    part=[]
+
+    # Truncate the probabilities of the components, and
+    # optionally only evaluate the nearest components.
+    trunc=topk is not None or logtol is not None or numcand is not None or candtol is not None
+
+    # Keep the summaries of the chunks, which are built on the first sweep,
+    # as long as they fit in the budget. The chunks which do not fit are
+    # not summarized again.
+    if summary is not None:
+        used=sum(s.nbytes for s in summary.values() if s is not None)
+
+    # Only keep time if the phases are profiled.
+    tick=lap(timer,None,None)
+
+    # Index the components once for all the sets.
+    if candtol is not None:
+        tree=nearindex(comp,emiss,nu=nu)
+
+    for a,b in span:
+
+        if isinstance(obs,corpus):
+            data=obs[a:b].data
+            offset=obs.offset[a:b+1]-obs.offset[a]
+        elif b>a+1:
+            data=numpy.concatenate(obs[a:b],axis=1)
+            offset=numpy.concatenate([[0],numpy.cumsum([numpy.shape(x)[1] for x in obs[a:b]])])
+        else:
+            data=obs[a]
+            offset=[0,numpy.shape(data)[1]]
+
+        if candtol is not None:
+
+            index,valid=nearby(comp,emiss,data,candtol,nu=nu,tree=tree)
+
+            loglik=numpy.zeros(numpy.shape(index),dtype=comp.dtype)
+            chunkweight=numpy.ones(numpy.shape(index),dtype=comp.dtype)
+
+            size=valid.sum(axis=0)
+            order=numpy.argsort(size,kind='stable')
+
+            # Evaluate the expected log-likelihood of the observations, and
+            # the expected value of the weights, given the components which
+            # may matter. The observations are sorted by their number of
+            # components, and each block of them is only padded up to the
+            # largest number in the block. The padding does not contribute.
+            for i in range(0,len(order),4096):
+                ind=order[i:i+4096]
+                m=size[ind[-1]]
+                loglik[:m,ind],chunkweight[:m,ind]=comp.loglik(data[:,ind],nu=nu,index=index[:m,ind])
+
+            loglik[~valid]=-numpy.inf
+
+        elif numcand is not None and numcand<numcomp:
+
+            index=candidates(comp,data,numcand)
+
+            # Evaluate the expected log-likelihood of the observations,
+            # and the expected value of the weights, given the nearest
+            # components.
+            loglik,chunkweight=comp.loglik(data,nu=nu,index=index)
+
+        else:
+
+            # Evaluate the expected log-likelihood
+            # of the observations, and the expected
+            # value of the weights.
+            loglik,chunkweight=comp.loglik(data,nu=nu)
+
+            index=numpy.broadcast_to(numpy.arange(numcomp)[:,numpy.newaxis],numpy.shape(loglik))
+
+        tick=lap(timer,'loglik',tick)
+
+        chunkprob=numpy.zeros_like(loglik)
+        chunkconst=numpy.zeros(offset[-1])
+
+        for j,k,l in zip(range(a,b),offset[:-1],offset[1:]):
+            if trunc:
+                chunkconst[k:l],chunkprob[:,k:l],cond[j]=normalize(loglik[:,k:l],emiss,post[j],noisetemp=noisetemp,
+                                                                  index=index[:,k:l])
+            else:
+                chunkconst[k:l],chunkprob[:,k:l],cond[j]=normalize(loglik[:,k:l],emiss,post[j],noisetemp=noisetemp)
+
+        # Only keep the largest probabilities of the
+        # observations of the chunk in sparse form.
+        if trunc:
+            chunkconst,chunkprob,chunkweight=sparsify(chunkconst,chunkprob,chunkweight,index,numcomp,
+                                                      topk=topk,logtol=logtol)
+
+        # Accumulate the log-normalization constants.
+        bound+=chunkconst.sum()
+
+        for j,k,l in zip(range(a,b),offset[:-1],offset[1:]):
+
+            # Split the local quantities into the sets. The sparse ones
+            # share their structure, whose columns are those of the sets.
+            if trunc:
+                ptr=chunkprob.indptr
+                prob[j]=sparse.csc_array((chunkprob.data[ptr[k]:ptr[l]],chunkprob.indices[ptr[k]:ptr[l]],
+                                          ptr[k:l+1]-ptr[k]),shape=(numcomp,l-k))
+                weight[j]=sparse.csc_array((chunkweight.data[ptr[k]:ptr[l]],chunkweight.indices[ptr[k]:ptr[l]],
+                                            ptr[k:l+1]-ptr[k]),shape=(numcomp,l-k))
+            else:
+                prob[j]=chunkprob[:,k:l]
+                weight[j]=chunkweight[:,k:l]
+
+            # Compute the expected number of observations
+            # allocated to each group and component.
+            count[j]=cond[j]*prob[j].sum(axis=1,dtype=numpy.float64)[numpy.newaxis,:]
+
+        # Only summarize the chunk if its size, known from its
+        # shape, fits in what is left of the budget.
+        if summary is not None and (a,b) not in summary:
+
+            size=comp.summarysize(numpy.shape(data)[1])
+
+            if used+size>cachesize:
+                summary[a,b]=None
+            else:
+                summary[a,b]=comp.summarize(data)
+                used+=size
+
+        # Reduce the summary of the chunk instead of the observations.
+        if summary is not None and summary[a,b] is not None:
+            data=summary[a,b]
+
+        evidence.append((data,chunkweight,chunkprob))
+
+        # Only the probabilities of the groups given the
+        # components are kept, unless the local quantities
+        # of the observations are kept.
+        if not keeplocal:
+            prob[a:b]=weight[a:b]=[None]*(b-a)
+
+        buffered+=offset[-1]
+
+        tick=lap(timer,'normalize',tick)
+
+        if isinstance(obs,corpus) or buffered>=chunksize:
+
+            # Accumulate the expected sufficient statistics of the
+            # components for the chunks which are complete.
+            part.append(comp.stat(evidence,weighted=True,scaled=True))
+
+            evidence=[]
+            buffered=0
+
+            tick=lap(timer,'stat',tick)
+
+    # Subtract the divergences of the distributions over the
+    # sample-specific parameters, unless the bound is skipped.
+    if evalbound:
+        bound-=divsum(prior,post)
+    else:
+        bound=numpy.nan
+
+    for j in range(numsamp):
+
+        # Accumulate the expected sufficient statistics.
+        stat=post[j].stat([count[j].sum(axis=1,keepdims=True)])
+
+        # Update the posterior distributions
+        # over the sample-specific parameters.
+        post[j].copy(prior[j]).update(stat)
+
+    count=sum(count) if numsamp>0 else numpy.zeros([numgroup,numcomp])
+
+    tick=lap(timer,'samp',tick)
+
+    # Accumulate the expected sufficient statistics of the remaining
+    # chunks, and merge the statistics of all the chunks.
+    if len(evidence)>0 or len(part)==0:
+        part.append(comp.stat(evidence,weighted=True,scaled=True))
+
+    stat=part[0] if len(part)==1 else comp.merge(part)
+
+    tick=lap(timer,'stat',tick)
+
+    return bound,count,stat,(prob,weight,cond)
+
+def localiter(comp,emiss,prior,post,obs,nu=numpy.inf,numiter=20,reltol=1.0e-6,timer=None):
+
+    numgroup,numcomp=numpy.shape(emiss)
+
+    numsamp=len(obs)
+
+    if isinstance(obs,corpus):
+        numpoint=obs.numpoint
+    else:
+        numpoint=[n for x in obs for d,n in (x.shape,)]
+
+    offset=numpy.concatenate([[0],numpy.cumsum(numpoint)]).astype(int)
+
+    # The distributions over the model-specific parameters are held fixed,
+    # so the expected log-likelihood of the observations of all the sets
+    # is evaluated once, rather than in each iteration.
+    tick=lap(timer,None,None)
+
+    loglik,weight=comp.loglik(join(obs),nu=nu)
+
+    tick=lap(timer,'loglik',tick)
+
+    index=numpy.repeat(numpy.arange(numsamp),numpoint)
+
+    val=[]
+
+    for i in range(numiter):
+
+        # Compute the joint log-probabilities of the groups and
+        # the components of all the sets at once, marginalize
+        # out the groups, and normalize.
+        joint=post.loglik()[:,:,numpy.newaxis]+emiss[numpy.newaxis,:,:]
+
+        const=joint.max(axis=2).max(axis=1)
+        cond=numpy.exp(joint-const[:,numpy.newaxis,numpy.newaxis])
+        marg=cond.sum(axis=1)
+        cond=numpy.divide(cond,marg[:,numpy.newaxis,:],out=numpy.zeros_like(cond),
+                          where=marg[:,numpy.newaxis,:]>0.0)
+
+        with numpy.errstate(divide='ignore'):
+            joint=loglik+(numpy.log(marg)+const[:,numpy.newaxis]).astype(loglik.dtype)[index,:].transpose()
+
+        logconst,prob=logsumexp(joint)
+
+        count=tally(prob,cond,offset)
+
+        tick=lap(timer,'normalize',tick)
+
+        val.append(numpy.bincount(index,weights=logconst,minlength=numsamp)-post.div(prior))
+
+        # Update the posterior distributions
+        # over the sample-specific parameters.
+        post.copy(prior).update(post.stat([count.sum(axis=2)[:,:,numpy.newaxis]]))
+
+        tick=lap(timer,'samp',tick)
+
+        if isconv(reltol,[v.sum() for v in val]):
+            break
+
+    return val[-1],prob,weight,cond,count,offset
+
+def localfit(comp,emiss,prior,post,obs,nu=numpy.inf,noisetemp=None,numiter=20,reltol=1.0e-6,timer=None,
+             keeplocal=True):
+
+    numgroup=post.dim
+
+    # The sets are independent while the distributions over the model
+    # parameters are fixed, so the sets of a corpus are fitted one chunk
+    # at a time, and the statistics of the chunks are merged.
+    if isinstance(obs,corpus) and len(list(obs.chunks()))>1:
+
+        bound,count,stat,prob,weight,cond=0.0,0.0,[],[],[],[]
+
+        for i,j in obs.chunks():
+
+            priorpart=dirichbank(j-i,numgroup,pi=prior.pi[i:j],alpha=prior.alpha[i:j])
+            part=dirichbank(j-i,numgroup,pi=post.pi[i:j],alpha=post.alpha[i:j])
+
+            val,c,s,(r,w,q)=localfit(comp,emiss,priorpart,part,obs[i:j],nu=nu,noisetemp=noisetemp,
+                                     numiter=numiter,reltol=reltol,timer=timer,keeplocal=keeplocal)
+
+            post.pi[i:j,:]=part.pi
+            post.alpha[i:j]=part.alpha
+
+            bound+=val
+            count+=c
+            stat.append(s)
+            prob.extend(r)
+            weight.extend(w)
+            cond.extend(q)
+
+        return bound,count,comp.merge(stat),(prob,weight,cond)
+
+    bound,prob,weight,cond,count,offset=localiter(comp,emiss,prior,post,obs,nu=nu,
+                                                  numiter=numiter,reltol=reltol,timer=timer)
+
+    tick=lap(timer,None,None)
+
+    # Only add noise to the probabilities which
+    # yield the statistics of the model.
+    if noisetemp is not None:
+        prob=perturb(prob,noisetemp)
+        cond=perturb(cond,noisetemp,axis=1)
+        count=tally(prob,cond,offset)
+
+    # Accumulate the expected sufficient statistics of all the components.
+    stat=comp.stat([(join(obs),weight,prob)],weighted=True,scaled=True)
+
+    tick=lap(timer,'stat',tick)
+
+    # Split the local quantities into the sets, unless only the
+    # probabilities of the groups given the components are kept.
+    if keeplocal:
+        prob=[prob[:,i:j] for i,j in zip(offset[:-1],offset[1:])]
+        weight=[weight[:,i:j] for i,j in zip(offset[:-1],offset[1:])]
+    else:
+        prob,weight=[None]*len(obs),[None]*len(obs)
+
+    return bound.sum(),count.sum(axis=0),stat,(prob,weight,list(cond))
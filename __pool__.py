@@ -0,0 +1,278 @@
+
+import copy,multiprocessing,numpy
+
+from multiprocessing import shared_memory
+from numpy import random
+
+# Import the module-specific classes and functions.
+from __corpus__ import corpus
+from __infer__ import compact,compactlocal,sweep
+
+def work(conn,source,offset,chunksize,prior,post,seed):
+
+    # Attach to the shared memory which holds the observations of the
+    # shard, or map the part of the file of the corpus which holds them.
+    if source[0]=='mmap':
+        filename,dtype,shape,start,order,i,j=source[1:]
+        mem=None
+        data=numpy.memmap(filename,dtype=dtype,mode='r',offset=start,shape=shape,order=order)[:,i:j]
+    else:
+        name,dtype,shape=source[1:]
+        mem=shared_memory.SharedMemory(name=name)
+        data=numpy.ndarray(shape,dtype=dtype,buffer=mem.buf)
+
+    if chunksize is not None:
+        obs=corpus(data[:,:offset[-1]],offset,chunksize=chunksize)
+    else:
+        obs=corpus(data[:,:offset[-1]],offset)
+
+    # Use an independent stream of random numbers in each worker.
+    random.seed(seed)
+
+    local=None
+
+    # Keep the summaries of the
+    # chunks of the shard.
+    summary={}
+
+    try:
+        while True:
+
+            cmd,arg=conn.recv()
+
+            if cmd=='sweep':
+
+                comp,emiss,nu,noisetemp,profiled,evalbound,topk,logtol,numcand,candtol,cachesize,keeplocal=arg
+
+                timer={} if profiled else None
+
+                # Update the distributions over the sample-specific parameters
+                # of the shard, and only return the reduced statistics.
+                bound,count,stat,local=sweep(comp,emiss,prior,post,obs,nu=nu,noisetemp=noisetemp,
+                                             timer=timer,evalbound=evalbound,topk=topk,logtol=logtol,
+                                             numcand=numcand,candtol=candtol,
+                                             summary=summary if cachesize is not None else None,
+                                             cachesize=cachesize,keeplocal=keeplocal)
+
+                conn.send((bound,count,stat,timer))
+
+            elif cmd=='compact':
+
+                groupmat,compmat=arg
+
+                # Drop the pruned groups from the distributions over the
+                # sample-specific parameters, and fold the local quantities.
+                prior=compact(prior,groupmat)
+                post=compact(post,groupmat)
+                local=compactlocal(local,groupmat,compmat)
+
+            elif cmd=='fetch':
+
+                # Only send the local quantities if they are asked for.
+                conn.send((post,)+local if arg else (post,))
+
+            else:
+                break
+
+    finally:
+
+        # Release the views before detaching from the shared memory.
+        del data,obs
+        if mem is not None:
+            mem.close()
+        conn.close()
+
+class pool(object):
+
+    def __init__(self,obs,prior,post,workers,dtype=numpy.float64):
+
+        assert workers>0 and len(obs)==len(prior)==len(post)
+
+        if isinstance(obs,corpus):
+            numpoint=obs.numpoint
+            source=obs.source
+            chunksize=obs.chunksize
+        else:
+            numpoint=numpy.array([n for x in obs for d,n in (x.shape,)])
+            source=None
+            chunksize=None
+
+        # Split the sets into contiguous shards with
+        # roughly the same number of observations.
+        split=numpy.searchsorted(numpy.cumsum(numpoint),
+                                 numpy.sum(numpoint)*numpy.arange(1,workers)/workers,side='right')
+        split=numpy.unique(numpy.concatenate([[0],split,[len(obs)]]))
+
+        self.__shard__=[]
+
+        seed=random.randint(2**31,size=len(split)-1)
+
+        for s,i,j in zip(seed,split[:-1],split[1:]):
+
+            offset=numpy.concatenate([[0],numpy.cumsum(numpoint[i:j])])
+
+            if source is not None:
+
+                # The corpus maps a file, so each process maps
+                # the same pages rather than a copy of them.
+                start=obs.offset[i]
+                arg=('mmap',)+source+(start,start+max(offset[-1],1))
+                mem=None
+
+            else:
+
+                shape=(obs[0].shape[0],max(offset[-1],1))
+
+                # Copy the observations of the shard into a block
+                # of shared memory, in the precision of the model.
+                mem=shared_memory.SharedMemory(create=True,size=numpy.dtype(dtype).itemsize*shape[0]*shape[1])
+                data=numpy.ndarray(shape,dtype=dtype,buffer=mem.buf)
+                for x,a,b in zip(obs[i:j],offset[:-1],offset[1:]):
+                    data[:,a:b]=x
+                del data
+
+                arg=('shm',mem.name,dtype,shape)
+
+            conn,child=multiprocessing.Pipe()
+
+            proc=multiprocessing.Process(target=work,args=(child,arg,offset,chunksize,
+                                                           prior[i:j],post[i:j],s))
+            proc.daemon=True
+            proc.start()
+
+            child.close()
+
+            self.__shard__.append((proc,conn,mem))
+
+    def sweep(self,comp,emiss,nu=numpy.inf,noisetemp=None,timer=None,evalbound=True,
+              topk=None,logtol=None,numcand=None,candtol=None,cachesize=None,keeplocal=True):
+
+        # Share the budget of the
+        # summaries among the shards.
+        if cachesize is not None:
+            cachesize=cachesize/len(self.__shard__)
+
+        for proc,conn,mem in self.__shard__:
+            conn.send(('sweep',(comp,emiss,nu,noisetemp,timer is not None,evalbound,
+                                topk,logtol,numcand,candtol,cachesize,keeplocal)))
+
+        bound,count,stat,shardtimer=zip(*[conn.recv() for proc,conn,mem in self.__shard__])
+
+        # Add up the time which the
+        # processes spent in each phase.
+        if timer is not None:
+            for t in shardtimer:
+                for name,val in t.items():
+                    timer[name]=timer.get(name,0.0)+val
+
+        # Reduce the statistics of the shards.
+        return sum(bound),sum(count),comp.merge(stat)
+
+    def compact(self,groupmat,compmat):
+
+        for proc,conn,mem in self.__shard__:
+            conn.send(('compact',(groupmat,compmat)))
+
+    def fetch(self,local=True):
+
+        for proc,conn,mem in self.__shard__:
+            conn.send(('fetch',local))
+
+        post,prob,weight,cond=[],[],[],[]
+
+        # Gather the distributions over the sample-specific parameters,
+        # and the latest local quantities, unless they are not needed.
+        for proc,conn,mem in self.__shard__:
+            if local:
+                p,r,w,c=conn.recv()
+                post.extend(p)
+                prob.extend(r)
+                weight.extend(w)
+                cond.extend(c)
+            else:
+                p,=conn.recv()
+                post.extend(p)
+
+        if not local:
+            return post
+
+        return post,prob,weight,cond
+
+    def close(self):
+
+        for proc,conn,mem in self.__shard__:
+            try:
+                conn.send(('close',None))
+            except (BrokenPipeError,OSError):
+                pass
+
+        for proc,conn,mem in self.__shard__:
+            proc.join()
+            conn.close()
+            if mem is not None:
+                mem.close()
+                mem.unlink()
+
+        self.__shard__=[]
+
+class halt(Exception):
+    pass
+
+# The bounds of the iterations of all the restarts,
+# which are shared by the processes of a race.
+board=None
+
+def attach(shared):
+
+    global board
+
+    board=shared
+
+def race(mod,obs,r,seed,numrestart,numiter,racestart,racetol,kwargs):
+
+    table=numpy.frombuffer(board).reshape([numrestart,max(numiter)])
+
+    # Fit a copy of the model from its prior distributions, so
+    # that each restart is independent of the others.
+    mod=copy.deepcopy(mod)
+    mod.__post__=None
+    mod.__stat__=None
+
+    # Use an independent stream of random numbers in each restart.
+    random.seed(seed)
+
+    hook=kwargs.pop('hook',None)
+
+    def check(i,phase,info):
+
+        if hook is not None:
+            hook(i,phase,info)
+
+        # The bound of a rejected extrapolated step
+        # is dropped, so it does not join the race.
+        if phase=='iter' and not info['rejected']:
+
+            table[r,i]=info['bound']
+
+            # Stop the restart once its bound is clearly behind the
+            # bound of the leading restart at the same iteration. The
+            # iterations whose bound was skipped are not compared.
+            if i>=racestart and not numpy.isnan(info['bound']):
+                lead=numpy.nanmax(table[:,i])
+                if info['bound']<lead-racetol*abs(lead):
+                    raise halt()
+
+    try:
+        prob,weight,bound=mod.infer(*obs,numiter=numiter,hook=check,**kwargs)
+    except halt:
+        return None
+
+    # The restart has converged, so its bound is
+    # final for the iterations which it skipped.
+    i=numpy.where(numpy.isfinite(table[r,:]))[0].max()
+    table[r,i:]=table[r,i]
+
+    # Return the size of the model and the prior distributions
+    # as well, which change if the model was pruned.
+    return table[r,i],mod.__size__,mod.__prior__,mod.__post__,mod.__stat__,prob,weight,bound
+
@@ -0,0 +1,73 @@
+
+import numpy
+
+class profile(object):
+
+    # Collect the timings of the phases of each iteration, which are
+    # passed to the hook of model.infer, and aggregate them. Memory is
+    # only reported if tracemalloc is tracing.
+    def __init__(self):
+
+        self.__time__={}
+        self.__count__={}
+        self.__memory__=[]
+        self.__bound__=[]
+        self.__delta__=[]
+
+        return
+
+    def __call__(self,i,phase,info):
+
+        if phase=='iter':
+
+            # Keep the totals of each iteration.
+            self.__memory__.append(info['memory'])
+            self.__bound__.append(info['bound'])
+            self.__delta__.append(info['delta'])
+
+        self.__time__[phase]=self.__time__.get(phase,0.0)+info['time']
+        self.__count__[phase]=self.__count__.get(phase,0)+1
+
+    @property
+    def time(self):
+        return dict(self.__time__)
+
+    @property
+    def count(self):
+        return dict(self.__count__)
+
+    @property
+    def memory(self):
+        return list(self.__memory__)
+
+    @property
+    def bound(self):
+        return list(self.__bound__)
+
+    @property
+    def delta(self):
+        return list(self.__delta__)
+
+    def summary(self):
+
+        total=self.__time__.get('iter',0.0)
+
+        line=['%-12s %8s %12s %12s %8s'%('phase','calls','total [s]','mean [s]','share')]
+
+        # Tabulate the time spent in each phase, relative
+        # to the total time spent in the iterations.
+        for phase,val in sorted(self.__time__.items(),key=lambda item:-item[1]):
+            if phase!='iter':
+                line.append('%-12s %8d %12.6f %12.6f %7.1f%%'%(phase,self.__count__[phase],val,
+                                                                val/self.__count__[phase],
+                                                                100.0*val/total if total>0.0 else numpy.nan))
+
+        if 'iter' in self.__count__:
+            line.append('%-12s %8d %12.6f %12.6f %7.1f%%'%('iter',self.__count__['iter'],total,
+                                                            total/self.__count__['iter'],100.0))
+
+        memory=[m for m in self.__memory__ if m is not None]
+        if len(memory)>0:
+            line.append('peak memory: %d bytes'%max(memory))
+
+        return '\n'.join(line)
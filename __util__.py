@@ -1,9 +1,14 @@
 
-import math,numpy
+import concurrent.futures,math,numpy,os,time,warnings
 
 from numpy import linalg,random
 from scipy import special
 
+try:
+    from threadpoolctl import threadpool_limits
+except ImportError:
+    threadpool_limits=None
+
 def isconv(tol,val):
     if len(val)<2:
         return False
@@ -15,3 +20,66 @@ def unique(seq):
     ind=numpy.concatenate([numpy.array([0]),ind+1,numpy.array([numpy.size(seq)])])
     for i,j in zip(ind[:-1],ind[1:]):
         yield seq[order[i]],order[i:j]
+
+def lap(timer,name,tick):
+    if timer is None:
+        return None
+    now=time.perf_counter()
+    if name is not None:
+        timer[name]=timer.get(name,0.0)+(now-tick)
+    return now
+
+def sqdist(data,loc):
+    sqdist=(data**2).sum(axis=0)[:,numpy.newaxis]-2.0*numpy.dot(data.transpose(),loc.transpose())\
+        +(loc**2).sum(axis=1)[numpy.newaxis,:]
+    return numpy.maximum(sqdist,0.0)
+
+def kmeanspp(data,numcomp):
+    dim,size=numpy.shape(data)
+    loc=numpy.zeros([numcomp,dim])
+    loc[0,:]=data[:,random.randint(size)]
+    mindist=sqdist(data,loc[:1,:])[:,0]
+    for k in range(1,numcomp):
+        total=mindist.sum()
+        if total>0.0:
+            i=min(numpy.cumsum(mindist).searchsorted(total*random.rand()),size-1)
+        else:
+            i=random.randint(size)
+        loc[k,:]=data[:,i]
+        numpy.minimum(mindist,sqdist(data,loc[k:k+1,:])[:,0],out=mindist)
+    return loc
+
+def kmeans(data,loc,numiter=100,batchsize=1000):
+    dim,size=numpy.shape(data)
+    numcomp,dim=numpy.shape(loc)
+    loc=numpy.copy(loc)
+    count=numpy.zeros(numcomp)
+    for i in range(numiter):
+        batch=data[:,random.randint(size,size=min(batchsize,size))]
+        assign=sqdist(batch,loc).argmin(axis=1)
+        num=numpy.bincount(assign,minlength=numcomp)
+        total=numpy.dot(numpy.eye(numcomp)[:,assign],batch.transpose())
+        count+=num
+        ind,=numpy.where(num>0)
+        loc[ind,:]+=(total[ind,:]-num[ind,numpy.newaxis]*loc[ind,:])/count[ind,numpy.newaxis]
+    return loc
+
+executors={}
+
+blasvars=('OMP_NUM_THREADS','OPENBLAS_NUM_THREADS','MKL_NUM_THREADS','BLIS_NUM_THREADS')
+
+def execute(threads,func,args):
+    # Without threadpoolctl, the threads of the BLAS can only be limited by
+    # the environment, so the blocks are evaluated in turn unless it does.
+    if threadpool_limits is None and not any(os.environ.get(var)=='1' for var in blasvars):
+        warnings.warn('threadpoolctl is not installed, so the threads of the BLAS cannot be limited. '
+                      'Install it, or set OMP_NUM_THREADS=1, to evaluate the blocks concurrently.',
+                      RuntimeWarning,stacklevel=3)
+        return [func(arg) for arg in args]
+    key=os.getpid(),threads
+    if key not in executors:
+        executors[key]=concurrent.futures.ThreadPoolExecutor(max_workers=threads)
+    if threadpool_limits is None:
+        return list(executors[key].map(func,args))
+    with threadpool_limits(limits=1,user_api='blas'):
+        return list(executors[key].map(func,args))
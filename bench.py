@@ -0,0 +1,152 @@
+
+import itertools,json,sys,time,tracemalloc
+
+import numpy
+
+from numpy import random
+
+from __prof__ import profile
+from mixmod import model
+
+def measure(func,*args,trace=False,**kwargs):
+
+    # Time the function, and optionally trace the peak memory which it
+    # allocates. Tracing slows down the allocations, so the timings of
+    # traced runs are not representative.
+    if trace:
+        tracemalloc.start()
+
+    start=time.perf_counter()
+
+    val=func(*args,**kwargs)
+
+    wall=time.perf_counter()-start
+
+    if trace:
+        size,peak=tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    else:
+        peak=None
+
+    return val,wall,peak
+
+def fastest(numrep,func,*args,**kwargs):
+
+    # Trace the memory of one run, and keep the fastest of the other
+    # repetitions, which is the least affected by the rest of the system.
+    val,wall,peak=measure(func,*args,trace=True,**kwargs)
+    wall=min(measure(func,*args,**kwargs)[1] for i in range(numrep))
+
+    return val,wall,peak
+
+def iterate(mod,obs,alpha,nu,trace=False):
+
+    prof=profile()
+
+    # Run one iteration of infer, continuing from the posterior
+    # distributions, and collect the time of each of its phases
+    # through the hook. The memory is only reported for the whole
+    # iteration, and only if it is traced.
+    if trace:
+        tracemalloc.start()
+
+    mod.infer(*obs,alpha=alpha,nu=nu,initpost=False,numiter=[1,1],noisetemp=None,hook=prof)
+
+    if trace:
+        tracemalloc.stop()
+
+    peak=max(prof.memory) if trace else None
+
+    return {name:{'wall':val,'peak':peak if name=='iter' else None} for name,val in prof.time.items()}
+
+def bench(numgroup,numcomp,numdim,numsamp,numpoint,diag,numrep=3,seed=0):
+
+    alpha=5.0
+    nu=3.0
+
+    random.seed(seed)
+
+    mod=model(numgroup,numcomp,numdim,diag=diag)
+
+    # Set the hyper-parameters.
+    for i in range(numgroup):
+        mod.group[i].alpha=alpha
+    for i in range(numcomp):
+        mod.comp[i].omega=0.1
+        mod.comp[i].eta=max(10.0,numdim)
+
+    result={}
+
+    # Generate the sets.
+    (group,comp,weight,obs),wall,peak=fastest(numrep,mod.sim,*[numpoint]*numsamp,alpha=alpha,nu=nu)
+    result['sim']={'wall':wall,'peak':peak}
+
+    # Run a single iteration, so that the posterior distributions are
+    # initialized, and then time each phase of the iterations which
+    # infer runs.
+    mod.infer(*obs,alpha=alpha,nu=nu,numiter=[1,1],noisetemp=1.0e-2)
+
+    trace=iterate(mod,obs,alpha,nu,trace=True)
+    run=[iterate(mod,obs,alpha,nu) for i in range(numrep)]
+
+    for name in trace:
+        result[name]={'wall':min(r[name]['wall'] for r in run),'peak':trace[name]['peak']}
+
+    val,wall,peak=fastest(numrep,mod.transform,*obs,alpha=alpha,nu=nu)
+    result['transform']={'wall':wall,'peak':peak}
+
+    return result
+
+def compare(result,baseline,tol=1.25,floor=5.0e-3):
+
+    regress=[]
+
+    # Flag the timings which are slower than the baseline by more than
+    # the given factor. Timings shorter than the floor are dominated by
+    # noise, so they are compared with the floor instead.
+    for key,val in result.items():
+        if key in baseline:
+            for name,phase in val.items():
+                if name in baseline[key] and phase['wall']>tol*max(baseline[key][name]['wall'],floor):
+                    regress.append((key,name,phase['wall']/baseline[key][name]['wall']))
+
+    return regress
+
+# Set the grid of
+# problem sizes.
+grid={'numgroup':[2,4],
+      'numcomp':[3,10],
+      'numdim':[5,20],
+      'numsamp':[10,100],
+      'numpoint':[20,200],
+      'diag':[False,True]}
+
+if __name__=='__main__':
+
+    output=sys.argv[1] if len(sys.argv)>1 else 'bench.json'
+    baseline=sys.argv[2] if len(sys.argv)>2 else None
+
+    result={}
+
+    for val in itertools.product(*grid.values()):
+
+        size=dict(zip(grid.keys(),val))
+        key=','.join('%s=%s'%(k,v) for k,v in size.items())
+
+        result[key]=bench(**size)
+
+        print(key,' '.join('%s=%.4fs'%(k,v['wall']) for k,v in result[key].items()))
+
+    # Store the results as machine-readable data.
+    with open(output,'w') as f:
+        json.dump(result,f,indent=1,sort_keys=True)
+
+    if baseline is not None:
+
+        with open(baseline) as f:
+            regress=compare(result,json.load(f))
+
+        for key,name,ratio in regress:
+            print('regression: %s %s %.2fx'%(key,name,ratio))
+
+        sys.exit(1 if len(regress)>0 else 0)
@@ -14,13 +14,16 @@
 # specific mixing proportions. An additional layer of latent
 # variables interface the documents' topics and words.
 
-import copy,math,numpy
+import copy,math,multiprocessing,numpy,os,time,tracemalloc
 
 from numpy import linalg,random
 
 # Import the module-specific classes and functions.
-from __dist__ import dirich,gaussgamma,gausswish
-from __util__ import isconv,unique
+from __corpus__ import corpus
+from __dist__ import dirich,dirichbank,gaussgamma,gaussgammabank,gausswish,gausswishbank
+from __infer__ import compact,compactlocal,localfit,localiter,sweep
+from __pool__ import attach,pool,race
+from __util__ import isconv,kmeans,kmeanspp,lap,sqdist,unique
 
 class model():
 
@@ -31,21 +34,29 @@ class model():
         group=None
         comp=None
 
-    def __init__(self,numgroup,numcomp,numdim,diag=False):
+    def __init__(self,numgroup,numcomp,numdim,diag=False,dtype=numpy.float64,threads=1):
 
-        # Check the size of the model.
+        # Check the size of the model, that the precision of the
+        # computations is supported, and the number of threads.
         assert numgroup>0 and numcomp>0 and numdim>0
+        assert numpy.dtype(dtype) in (numpy.float32,numpy.float64)
+        assert threads>0
 
         self.__size__=numgroup,numcomp,numdim
         self.__prior__=model.paramdist()
 
-        dist=gaussgamma if diag else gausswish
+        bank=gaussgammabank if diag else gausswishbank
 
-        # Initialize the prior distributions over the model parameters.
+        # Initialize the prior distributions over the model parameters. The
+        # distributions over the components are stored in a bank of stacked
+        # arrays, which can also be indexed as individual distributions. The
+        # bank evaluates the quantities of the observations in the given
+        # precision, split into blocks over the given number of threads.
         self.__prior__.group=[dirich(numcomp) for i in range(numgroup)]
-        self.__prior__.comp=[dist(numdim) for i in range(numcomp)]
+        self.__prior__.comp=bank(numcomp,numdim,dtype=dtype,threads=threads)
 
         self.__post__=None
+        self.__stat__=None
 
     @property
     def group(self):
@@ -74,6 +85,7 @@ class model():
         self.__prior__.group=group
 
         self.__post__=None
+        self.__stat__=None
 
     @property
     def comp(self):
@@ -85,7 +97,7 @@ class model():
         return dist.comp
 
     @comp.setter
-    def comp(self,*comp):
+    def comp(self,comp):
 
         numgroup,numcomp,numdim=self.__size__
 
@@ -99,14 +111,109 @@ class model():
 
         # Set these as the prior distributions
         # over the component-specific parameters.
-        self.__prior__.comp=comp
+        self.__prior__.comp.copy(comp)
 
         self.__post__=None
+        self.__stat__=None
 
-    def sim(self,*size,alpha=numpy.inf,nu=numpy.inf):
+    def __update__(self,post,count,stat):
 
-        # Check that the sizes and hyper-parameters are valid.
-        assert all(n>0 for n in size) and alpha>0.0 and nu>0.0
+        numgroup,numcomp,numdim=self.__size__
+
+        prior=self.__prior__
+
+        # Update the posterior distributions over
+        # the model-specific component parameters.
+        post.comp.copy(prior.comp).update(stat)
+
+        for j in range(numgroup):
+
+            # Accumulate the expected sufficient statistics.
+            stat=post.group[j].stat([count[j,:,numpy.newaxis]])
+
+            # Update the posterior distributions
+            # over the model-specific group parameters.
+            post.group[j].copy(prior.group[j]).update(stat)
+
+        return post
+
+    def __sets__(self,obs):
+
+        numgroup,numcomp,numdim=self.__size__
+
+        # A corpus holds all the sets in one
+        # array, rather than one array per set.
+        if len(obs)==1 and isinstance(obs[0],corpus):
+
+            obs,=obs
+
+            # Check that the corpus is consistent with the size of the model.
+            assert obs.dim==numdim
+
+            return obs,obs.numpoint
+
+        # Check that there the arguments are consistent with the size of the model.
+        assert all(numpy.ndim(x)==2 and d==numdim for x in obs for d,n in (x.shape,))
+
+        return list(obs),[n for x in obs for d,n in (x.shape,)]
+
+    def __draw__(self,size,prop,emiss,loc,fact,nu):
+
+        numgroup,numcomp,numdim=self.__size__
+
+        numpoint=numpy.array(size,dtype=int)
+        offset=numpy.concatenate([[0],numpy.cumsum(numpoint)])
+
+        index=numpy.repeat(numpy.arange(len(size)),numpoint)
+
+        # Generate the group indices of the observations of all the sets
+        # at once, by counting the cumulative sums of the proportions of
+        # their sets which are below uniform numbers. The sums are compared
+        # one group at a time, so that only arrays of the size of the
+        # observations are formed.
+        cumprop=prop.rand().cumsum(axis=1)
+        samp=random.rand(offset[-1])
+        group=numpy.zeros(offset[-1],dtype=int)
+        for g in range(numgroup):
+            group+=cumprop[index,g]<samp
+        numpy.minimum(group,numgroup-1,out=group)
+
+        # Generate the component indices of the observations of each group
+        # by searching the cumulative sums of the probabilities of the group.
+        cumemiss=emiss.cumsum(axis=1)
+        samp=random.rand(offset[-1])
+        comp=numpy.zeros(offset[-1],dtype=int)
+        for g,ind in unique(group):
+            comp[ind]=numpy.searchsorted(cumemiss[g,:],samp[ind],side='left')
+        numpy.minimum(comp,numcomp-1,out=comp)
+
+        # Generate the observation weights.
+        if numpy.isfinite(nu):
+            weight=random.gamma(nu/2.0,size=offset[-1])/(nu/2.0)
+        else:
+            weight=numpy.ones(offset[-1])
+
+        obs=numpy.zeros([numdim,offset[-1]])
+
+        # Generate the deviations of the observations. The scales of the
+        # diagonal components are applied elementwise, while the
+        # observations of the other components are sorted by component,
+        # so that each factor is applied to one block of observations.
+        if numpy.ndim(fact)==2:
+            obs[:]=fact[comp,:].transpose()*random.randn(numdim,offset[-1])
+        else:
+            order=numpy.argsort(comp,kind='stable')
+            bound=numpy.concatenate([[0],numpy.cumsum(numpy.bincount(comp,minlength=numcomp))])
+            for k,i,j in zip(range(numcomp),bound[:-1],bound[1:]):
+                obs[:,order[i:j]]=numpy.dot(fact[k],random.randn(numdim,j-i))
+
+        # Scale the deviations, and add the locations.
+        obs/=numpy.sqrt(weight)[numpy.newaxis,:]
+        obs+=loc[comp,:].transpose()
+
+        return group,comp,weight,corpus(obs,offset)
+
+    def __simparam__(self):
 
         numgroup,numcomp,numdim=self.__size__
 
@@ -114,58 +221,418 @@ class model():
         # parameters. If they are not initialized, then select the prior.
         dist=self.__post__ if self.__post__ is not None else self.__prior__
 
-        # Create a distribution over
-        # the sample-specific parameters.
-        prop=dirich(numgroup,alpha=alpha)
-
         # Generate the model-specific parameters.
-        emiss=[p.rand() for p in dist.group]
-        loc,disp=zip(*[p.rand() for p in dist.comp])
+        emiss=numpy.array([p.rand() for p in dist.group])
+        loc,disp=dist.comp.rand()
+
+        # Factorize the dispersion of each component once, rather
+        # than once for each set. The diagonal dispersions only
+        # need their square roots.
+        if numpy.ndim(disp)==2:
+            fact=numpy.sqrt(disp)
+        else:
+            fact=linalg.cholesky(disp)
+
+        return emiss,loc,fact
+
+    def __subsample__(self,obs,numpoint,size):
+
+        offset=numpy.concatenate([[0],numpy.cumsum(numpoint)]).astype(int)
+
+        # Draw the indices of the subsample without replacement.
+        ind=numpy.sort(random.choice(offset[-1],min(size,offset[-1]),replace=False))
+
+        # The observations of a corpus are contiguous,
+        # so they can be selected directly.
+        if isinstance(obs,corpus):
+            return numpy.asarray(obs.data[:,ind],dtype=numpy.float64)
+
+        samp=numpy.searchsorted(offset,ind,side='right')-1
+
+        return numpy.array([obs[i][:,j-offset[i]] for i,j in zip(samp,ind)]).reshape([-1,numpy.shape(obs[0])[0]]).transpose()
+
+    def sim(self,*size,alpha=numpy.inf,nu=numpy.inf,join=False):
+
+        # Check that the sizes and hyper-parameters are valid.
+        assert all(n>0 for n in size) and alpha>0.0 and nu>0.0
+
+        numgroup,numcomp,numdim=self.__size__
+
+        # Create distributions over the
+        # sample-specific parameters.
+        prop=dirichbank(len(size),numgroup,alpha=alpha)
+
+        emiss,loc,fact=self.__simparam__()
+
+        group,comp,weight,obs=self.__draw__(size,prop,emiss,loc,fact,nu)
+
+        # Return the indices and the weights of all the sets
+        # in single arrays, and the observations as a corpus.
+        if join:
+            return group,comp,weight,obs
+
+        offset=obs.offset
+
+        # Otherwise, split them into views of the individual sets.
+        group,comp,weight=[[x[i:j] for i,j in zip(offset[:-1],offset[1:])] for x in (group,comp,weight)]
+
+        return group,comp,weight,list(obs)
+
+    def simchunks(self,*size,alpha=numpy.inf,nu=numpy.inf,chunksize=65536):
+
+        # Check that the sizes and hyper-parameters are valid.
+        assert all(n>0 for n in size) and alpha>0.0 and nu>0.0 and chunksize>0
+
+        numgroup,numcomp,numdim=self.__size__
+
+        # Generate the model-specific parameters once,
+        # so that every chunk shares the same model.
+        emiss,loc,fact=self.__simparam__()
+
+        offset=numpy.concatenate([[0],numpy.cumsum(size)])
+
+        i=0
+
+        # Generate the sets in contiguous chunks, each of which has at
+        # most as many observations as the size of the chunks, unless
+        # a single set has more.
+        while i<len(size):
+
+            j=numpy.searchsorted(offset,offset[i]+chunksize,side='right')-1
+            j=min(max(j,i+1),len(size))
+
+            prop=dirichbank(j-i,numgroup,alpha=alpha)
 
-        group,comp,weight,obs=[],[],[],[]
+            yield self.__draw__(size[i:j],prop,emiss,loc,fact,nu)
 
-        for i,numpoint in enumerate(size):
+            i=j
 
-            # Generate the group indices.
-            group.append(prop.rand().cumsum().searchsorted(random.rand(numpoint)))
+    def __natural__(self,post):
 
-            comp.append(numpy.zeros(numpoint,dtype=int))
-            weight.append(numpy.zeros(numpoint))
-            obs.append(numpy.zeros([numdim,numpoint]))
+        comp=post.comp
 
-            # Generate the component indices.
-            for j,ind in unique(group[i]):
-                comp[i][ind]=emiss[j].cumsum().searchsorted(random.rand(len(ind)))
+        mu=comp.mu
+        omega=comp.omega
 
-            # Generate the observation weights.
-            if numpy.isfinite(nu):
-                weight[i]=random.gamma(nu/2.0,size=numpoint)/(nu/2.0)
+        # Compute the natural parameters, which are linear in the
+        # statistics of the data. The scatter matrices include the
+        # outer products of the means.
+        if numpy.ndim(comp.sigma)==3:
+            scatter=comp.eta[:,numpy.newaxis,numpy.newaxis]*comp.sigma\
+                +omega[:,numpy.newaxis,numpy.newaxis]*mu[:,:,numpy.newaxis]*mu[:,numpy.newaxis,:]
+        else:
+            scatter=comp.eta[:,numpy.newaxis]*comp.sigma+omega[:,numpy.newaxis]*mu**2
+
+        return (numpy.array([q.alpha*q.pi for q in post.group]),
+                numpy.copy(omega),omega[:,numpy.newaxis]*mu,scatter,numpy.copy(comp.eta))
+
+    def __extrapolate__(self,post,prev,curr,rate):
+
+        numgroup,numcomp,numdim=self.__size__
+
+        group,omega,loc,scatter,eta=[p+rate*(c-p) for p,c in zip(prev,curr)]
+
+        comp=post.comp
+
+        # Only extrapolate the distributions which are not singular.
+        fin=numpy.isfinite(omega)&numpy.isfinite(eta)
+        grp=numpy.isfinite(group).all(axis=1)
+
+        ind,=numpy.where(fin)
+
+        mu=numpy.copy(comp.mu)
+        sigma=numpy.copy(comp.sigma)
+
+        mu[ind,:]=loc[ind,:]/omega[ind,numpy.newaxis]
+
+        if numpy.ndim(sigma)==3:
+            sigma[ind,:,:]=(scatter[ind,:,:]-omega[ind,numpy.newaxis,numpy.newaxis]
+                            *mu[ind,:,numpy.newaxis]*mu[ind,numpy.newaxis,:])/eta[ind,numpy.newaxis,numpy.newaxis]
+            sigma[ind,:,:]=sigma[ind,:,:]/2.0+(sigma[ind,:,:]/2.0).transpose([0,2,1])
+            valid=numpy.all(eta[ind]>numdim-1.0) and numpy.all(linalg.eigvalsh(sigma[ind,:,:])>0.0)
+        else:
+            sigma[ind,:]=(scatter[ind,:]-omega[ind,numpy.newaxis]*mu[ind,:]**2)/eta[ind,numpy.newaxis]
+            valid=numpy.all(eta[ind]>0.0) and numpy.all(sigma[ind,:]>0.0)
+
+        # Fall back to the plain step if the extrapolated
+        # parameters are not those of valid distributions.
+        if not (valid and numpy.all(omega[ind]>0.0) and numpy.all(group[grp,:]>=0.0)):
+            return False
+
+        for q,g,f in zip(post.group,group,grp):
+            if f:
+                q.copy(dirich(numcomp,pi=g/g.sum(),alpha=g.sum()))
+
+        comp.mu=mu
+        comp.omega=numpy.where(fin,omega,comp.omega)
+        comp.sigma=sigma
+        comp.eta=numpy.where(fin,eta,comp.eta)
+
+        return True
+
+    def __prune__(self,post,count,prunetol,mergetol):
+
+        numgroup,numcomp,numdim=self.__size__
+
+        group=count.sum(axis=1)
+        comp=count.sum(axis=0)
+
+        # Select the groups and the components whose expected number of
+        # observations is not below the threshold, keeping at least one.
+        groupkeep=numpy.ones(numgroup,dtype=bool)
+        compkeep=numpy.ones(numcomp,dtype=bool)
+
+        if prunetol is not None:
+            groupkeep=group>=prunetol
+            compkeep=comp>=prunetol
+            groupkeep[group.argmax()]=True
+            compkeep[comp.argmax()]=True
+
+        ind,=numpy.where(compkeep)
+
+        target=numpy.arange(numcomp)
+
+        if mergetol is not None and len(ind)>1:
+
+            # Evaluate the symmetric divergences between the posterior
+            # distributions of all the pairs of remaining components,
+            # which reuse the cached factors of the bank.
+            a,b=numpy.triu_indices(len(ind),1)
+            div=post.comp.div(post.comp,index=(ind[a],ind[b]))+post.comp.div(post.comp,index=(ind[b],ind[a]))
+
+            used=numpy.zeros(numcomp,dtype=bool)
+
+            # Merge the closest pairs first,
+            # and each component at most once.
+            for k in numpy.argsort(div):
+                if not div[k]<mergetol:
+                    break
+                i,j=ind[a[k]],ind[b[k]]
+                if not (used[i] or used[j]):
+                    target[j]=i
+                    used[i]=used[j]=True
+
+        if numpy.all(groupkeep) and numpy.all(compkeep) and numpy.all(target==numpy.arange(numcomp)):
+            return None
+
+        # Map the remaining components onto the columns of
+        # their targets, leaving the rows of the pruned empty.
+        pos=numpy.cumsum(compkeep&(target==numpy.arange(numcomp)))-1
+
+        compmat=numpy.zeros([numcomp,pos[-1]+1])
+        compmat[ind,pos[target[ind]]]=1.0
+
+        groupmat=numpy.eye(numgroup)[:,groupkeep]
+
+        return groupmat,compmat
+
+    def __compact__(self,post,groupmat,compmat):
+
+        numgroup,numcomp,numdim=self.__size__
+
+        prior=self.__prior__
+
+        group=groupmat.argmax(axis=0)
+        comp=compmat.argmax(axis=0)
+
+        # Keep the distributions over the parameters of the remaining
+        # groups and components. A merged component keeps the prior
+        # distribution of the component which it is merged into.
+        prior.group=[compact(prior.group[g],compmat) for g in group]
+        post.group=[compact(post.group[g],compmat) for g in group]
+        prior.comp=prior.comp.take(comp)
+        post.comp=post.comp.take(comp)
+
+        # Drop the pruned groups from the distributions
+        # over the sample-specific parameters.
+        prior.samp=compact(prior.samp,groupmat)
+        post.samp=compact(post.samp,groupmat)
+
+        self.__size__=len(group),len(comp),numdim
+
+    def __checkpoint__(self,path,post,numiter,bound,run=None,index=None,accel=None):
+
+        # Store the parameters of the posterior distributions, the
+        # bound, the number of completed iterations and the state of
+        # the random number generator as contiguous arrays.
+        name,key,pos,hasgauss,gauss=random.get_state()
+
+        state={'numiter':numiter,
+               'bound':numpy.array(bound),
+               'grouppi':numpy.array([q.pi for q in post.group]),
+               'groupalpha':numpy.array([q.alpha for q in post.group]),
+               'compmu':post.comp.mu,
+               'compomega':post.comp.omega,
+               'compsigma':post.comp.sigma,
+               'competa':post.comp.eta,
+               'samppi':numpy.array([q.pi for q in post.samp]).reshape([len(post.samp),-1]),
+               'sampalpha':numpy.array([q.alpha for q in post.samp],dtype=float),
+               'rngkey':key,
+               'rngstate':numpy.array([pos,hasgauss,gauss])}
+
+        # Store the indices of the groups and the components
+        # which remain after pruning, relative to the model
+        # at the start of the run.
+        if index is not None:
+            groupindex,compindex=index
+            state.update({'groupindex':groupindex,
+                          'compindex':compindex})
+
+        # Store the running statistics of the stochastic updates.
+        if run is not None:
+            runcount,runstat=run
+            state.update({'runcount':runcount,
+                          'runmu':runstat.mu,
+                          'runomega':runstat.omega,
+                          'runsigma':runstat.sigma,
+                          'runeta':runstat.eta})
+
+        # Store the state of the acceleration, i.e. its step size, whether
+        # the last step was extrapolated, and the natural parameters of the
+        # plain step which an extrapolated step falls back to.
+        if accel is not None:
+            relax,extrap,plain=accel
+            group,omega,loc,scatter,eta=plain
+            state.update({'relax':relax,
+                          'extrap':extrap,
+                          'plaingroup':group,
+                          'plainomega':omega,
+                          'plainloc':loc,
+                          'plainscatter':scatter,
+                          'plaineta':eta})
+
+        # Write to a temporary file first, so that an interruption
+        # never leaves behind a partially written checkpoint.
+        with open(path+'.tmp','wb') as f:
+            numpy.savez(f,**state)
+
+        os.replace(path+'.tmp',path)
+
+    def __resume__(self,path,post):
+
+        numgroup,numcomp,numdim=self.__size__
+
+        with numpy.load(path) as state:
+
+            # Drop the groups and the components which
+            # were pruned before the checkpoint.
+            if 'compindex' in state:
+
+                index=state['groupindex'],state['compindex']
+
+                if len(index[0])<numgroup or len(index[1])<numcomp:
+                    self.__compact__(post,numpy.eye(numgroup)[:,index[0]],numpy.eye(numcomp)[:,index[1]])
+                    numgroup,numcomp,numdim=self.__size__
+
+            else:
+                index=numpy.arange(numgroup),numpy.arange(numcomp)
+
+            # Check that the checkpoint is consistent with the
+            # size of the model and with the number of sets.
+            assert state['grouppi'].shape==(numgroup,numcomp)
+            assert state['compmu'].shape==post.comp.mu.shape
+            assert state['samppi'].shape==(len(post.samp),numgroup)
+
+            # Restore the parameters of the posterior distributions.
+            for q,pi,alpha in zip(post.group,state['grouppi'],state['groupalpha']):
+                q.copy(dirich(numcomp,pi=numpy.copy(pi),alpha=float(alpha)))
+            post.comp.mu=state['compmu']
+            post.comp.omega=state['compomega']
+            post.comp.sigma=state['compsigma']
+            post.comp.eta=state['competa']
+            for q,pi,alpha in zip(post.samp,state['samppi'],state['sampalpha']):
+                q.copy(dirich(numgroup,pi=numpy.copy(pi),alpha=float(alpha)))
+
+            pos,hasgauss,gauss=state['rngstate']
+
+            # Restore the state of the random number generator,
+            # so that the run continues exactly where it stopped.
+            random.set_state(('MT19937',state['rngkey'],int(pos),int(hasgauss),float(gauss)))
+
+            # Restore the running statistics of the stochastic updates.
+            if 'runcount' in state:
+                runstat=type(post.comp).param()
+                runstat.mu=state['runmu']
+                runstat.omega=state['runomega']
+                runstat.sigma=state['runsigma']
+                runstat.eta=state['runeta']
+                run=state['runcount'],runstat
             else:
-                weight[i][:]=1.0
+                run=None
 
-            # Generate the observations.
-            for j,ind in unique(comp[i]):
-                scale=numpy.sqrt(weight[i][ind])
-                obs[i][:,ind]=loc[j][:,numpy.newaxis]+numpy.dot(linalg.cholesky(disp[j]),
-                                  random.randn(numdim,len(ind)))/scale[numpy.newaxis,:]
+            # Restore the state of the acceleration.
+            if 'relax' in state:
+                plain=tuple(state[name] for name in ('plaingroup','plainomega','plainloc','plainscatter','plaineta'))
+                accel=float(state['relax']),bool(state['extrap']),plain
+            else:
+                accel=None
 
-        return group,comp,weight,obs
+            return int(state['numiter']),list(state['bound']),run,index,accel
 
     def infer(self,*obs,alpha=numpy.inf,nu=numpy.inf,initpost=True,
-              numiter=[10,1000],noisetemp=1.0e-2,reltol=1.0e-6):
+              numiter=[10,1000],noisetemp=1.0e-2,reltol=1.0e-6,fullprob=False,workers=1,
+              batchsize=None,stepdelay=1.0,stepdecay=0.7,checkpoint=None,checkpointiter=10,resume=None,
+              hook=None,initcomp=None,initsize=10000,accel=False,accelrate=1.2,boundstep=1,paramtol=None,
+              prunetol=None,mergetol=None,topk=None,logtol=None,numcand=None,candtol=None,cachesize=None,
+              keeplocal=True):
 
         numgroup,numcomp,numdim=self.__size__
 
-        # Check that there the arguments are consistent with the size of the model.
-        assert all(numpy.ndim(x)==2 and d==numdim for x in obs for d,n in (x.shape,))
-
-        numpoint=[n for x in obs for d,n in (x.shape,)]
+        obs,numpoint=self.__sets__(obs)
 
         prior=self.__prior__
         post=self.__post__
 
         numsamp=len(obs)
 
+        # Check that the size of the subsets and the
+        # step sizes of the stochastic updates are valid.
+        assert batchsize is None or (batchsize>0 and workers<=1)
+        assert stepdelay>0.0 and 0.5<stepdecay<=1.0
+
+        # Check that the interval between the checkpoints is valid.
+        assert checkpointiter>0
+
+        # Check that the initialization of the components is supported.
+        assert initcomp in (None,'kmeans++','kmeans') and initsize>0
+
+        # Check that the acceleration is only applied to the deterministic
+        # updates, and that the growth of its step size is valid.
+        assert not accel or batchsize is None
+        assert accelrate>1.0
+
+        # Check that the interval between the evaluations of the bound is
+        # valid. The acceleration needs the bound of every iteration.
+        assert boundstep>0 and (boundstep==1 or not accel)
+        assert paramtol is None or paramtol>0.0
+
+        # Check that the thresholds of the pruning and the merging are valid.
+        assert prunetol is None or prunetol>=0.0
+        assert mergetol is None or mergetol>0.0
+
+        # Check that the truncation of the probabilities of the components
+        # is valid, and that it is only applied to the deterministic updates.
+        # The truncated probabilities are sparse, so they are not expanded.
+        assert topk is None or topk>0
+        assert logtol is None or logtol>=0.0
+        assert numcand is None or numcand>0
+        assert (batchsize is None and not fullprob) or (topk is None and logtol is None and numcand is None
+                                                         and candtol is None)
+
+        # Check that the components are either selected by their number,
+        # or by the tolerance of the terms which are ignored.
+        assert candtol is None or (0.0<candtol<1.0 and numcand is None)
+
+        # Check that the budget of the summaries of the sets, in bytes, is
+        # valid, and that they are only reduced by the deterministic updates.
+        assert cachesize is None or (cachesize>=0 and batchsize is None)
+
+        # Check that the probabilities of the components are kept if they
+        # are expanded. Otherwise, the local quantities of the observations
+        # are dropped as soon as their statistics are reduced, and are not
+        # returned.
+        assert keeplocal or not fullprob
+
         if post is None:
 
             post=model.paramdist()
@@ -176,7 +643,9 @@ class model():
             post.comp=copy.deepcopy(prior.comp)
 
         # Initialize the distributions over the sample-specific parameters.
-        prior.samp=[dirich(numgroup,alpha=alpha) for i in range(numsamp)]
+        # The prior distributions are fixed, so they are
+        # stacked once rather than in each iteration.
+        prior.samp=dirichbank(numsamp,numgroup,alpha=alpha)
         post.samp=[dirich(numgroup,alpha=alpha) for i in range(numsamp)]
 
         if initpost:
@@ -193,94 +662,608 @@ class model():
             # the model-specific parameters.
             for i in range(numgroup):
                 post.group[i].alpha+=a
-            for i in range(numcomp):
-                post.comp[i].omega+=b
-                post.comp[i].eta+=b
 
-        prob=[None]*numsamp
-        weight=[None]*numsamp
+            if initcomp is None:
+                post.comp.omega+=b
+                post.comp.eta+=b
+
+            else:
+
+                data=self.__subsample__(obs,numpoint,initsize)
+
+                # Seed the locations of the components on a subsample
+                # of the observations, and optionally refine them by
+                # mini-batch k-means.
+                loc=kmeanspp(data,numcomp)
+                if initcomp=='kmeans':
+                    loc=kmeans(data,loc)
+
+                # Assign the subsample to the nearest locations, and
+                # update the distributions over the components as if
+                # the assignments were the responsibilities of all
+                # the observations.
+                assign=sqdist(data,loc).argmin(axis=1)
+                scale=numpy.eye(numcomp)[:,assign]*(float(sum(numpoint))/float(numpy.shape(data)[1]))
+
+                post.comp.copy(prior.comp).update(post.comp.stat([(data,scale)],scaled=True))
 
         bound=[]
 
-        for i in range(max(numiter)):
+        start=0
 
-            bound.append(0.0)
+        # Keep track of the groups and the components which remain
+        # after pruning, relative to the model at the start.
+        groupindex=numpy.arange(numgroup)
+        compindex=numpy.arange(numcomp)
 
-            for j in range(numsamp):
+        # Start the acceleration with plain steps.
+        relax=1.0
+        extrap=False
 
-                loglik=numpy.zeros([numcomp,numpoint[j]])
+        # Continue a run which was interrupted from its last checkpoint. This
+        # overrides the initialization of the posterior distributions.
+        if resume is not None:
+            start,bound,run,(groupindex,compindex),accelstate=self.__resume__(resume,post)
 
-                if weight[j] is None:
-                    weight[j]=numpy.zeros([numcomp,numpoint[j]])
+            numgroup,numcomp,numdim=self.__size__
 
-                # Evaluate the expected log-likelihood
-                # of the observations, and the expected
-                # value of the weights.
-                for k in range(numcomp):
-                    loglik[k,:],weight[j][k,:]=post.comp[k].loglik(obs[j],nu=nu)
+            assert start<max(numiter)
 
-                # Compute the joint log-probabilities.
-                prob[j]=post.samp[j].loglik().reshape([numgroup,1,1])\
-                    +numpy.reshape([q.loglik() for q in post.group],[numgroup,numcomp,1])\
-                    +loglik[numpy.newaxis,:,:]
+            if run is not None:
+                runcount,runstat=run
 
-                logconst=prob[j].max(axis=0).max(axis=0)
-                logconst+=numpy.log(numpy.exp(prob[j]-logconst[numpy.newaxis,numpy.newaxis,:])
-                                    .sum(axis=0).sum(axis=0))
+            if accelstate is not None:
+                relax,extrap,plain=accelstate
 
-                # Normalize to obtain the probabilities.
-                prob[j]=numpy.exp(prob[j]-logconst[numpy.newaxis,numpy.newaxis,:])
+        if workers>1:
 
-                if i==0:
+            # Distribute the sets, and the distributions over the
+            # sample-specific parameters, over a pool of processes.
+            proc=pool(obs,prior.samp,post.samp,workers,dtype=post.comp.dtype)
 
-                    # Add a bit of noise in order to break ties.
-                    prob[j]*=1.0-noisetemp*random.rand(numgroup,numcomp,numpoint[j])
-                    prob[j]/=prob[j].sum(axis=0).sum(axis=0).reshape([1,1,numpoint[j]])
+        else:
+            proc=None
 
-                    prob[j][numpy.logical_or(numpy.isnan(prob[j]),
-                                             numpy.isinf(prob[j]))]=1.0/(numgroup*numcomp)
+        # Summarize the sets on the first sweep, and
+        # reduce the summaries in the later ones.
+        summary={} if cachesize is not None and proc is None else None
 
-                # Accumulate the log-normalization constants.
-                bound[i]+=logconst.sum()
+        # Report the time spent in each phase of an iteration, the
+        # peak memory, the bound and its change, and whether the
+        # extrapolated step of the iteration was rejected.
+        def report(i,timer,begin,rejected):
+            for name,val in timer.items():
+                hook(i,name,{'time':val})
+            hook(i,'iter',{'time':time.perf_counter()-begin,
+                           'memory':tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else None,
+                           'bound':bound[-1],
+                           'delta':bound[-1]-bound[-2] if len(bound)>1 else numpy.nan,
+                           'rejected':rejected})
+
+        try:
+            for i in range(start,max(numiter)):
+
+                # Only keep time if the iterations are profiled.
+                if hook is not None:
+                    timer={}
+                    if tracemalloc.is_tracing():
+                        tracemalloc.reset_peak()
+                    begin=tick=time.perf_counter()
+                else:
+                    timer=tick=None
+
+                emiss=numpy.array([q.loglik() for q in post.group])
+
+                tick=lap(timer,'emiss',tick)
+
+                # Only add noise in the first iteration.
+                temp=noisetemp if i==0 else None
 
-            # Evaluate the lower bound on the marginal log-likelihood of the data.
-            bound[i]-=sum(q.div(p) for p,q in zip(prior.samp,post.samp))\
-                +sum(q.div(p) for p,q in zip(prior.group,post.group))\
-                +sum(q.div(p) for p,q in zip(prior.comp,post.comp))
+                # Only evaluate the bound every few iterations, and in the last.
+                evalbound=i%boundstep==0 or i==max(numiter)-1
+
+                # Evaluate the local quantities of each set, update the distributions
+                # over the sample-specific parameters, and reduce the statistics of
+                # the sets into the expected sufficient statistics of the model.
+                if proc is not None:
+                    val,count,stat=proc.sweep(post.comp,emiss,nu=nu,noisetemp=temp,timer=timer,
+                                              evalbound=evalbound,topk=topk,logtol=logtol,numcand=numcand,
+                                              candtol=candtol,cachesize=cachesize,keeplocal=keeplocal)
+                elif batchsize is None:
+                    val,count,stat,local=sweep(post.comp,emiss,prior.samp,post.samp,obs,nu=nu,
+                                               noisetemp=temp,timer=timer,evalbound=evalbound,
+                                               topk=topk,logtol=logtol,numcand=numcand,candtol=candtol,
+                                               summary=summary,cachesize=cachesize,keeplocal=keeplocal)
 
-            for j in range(numsamp):
+                else:
 
-                # Accumulate the expected sufficient statistics.
-                stat=post.samp[j].stat([prob[j].sum(axis=1)])
+                    # Select a random subset of the sets, and only fit
+                    # the distributions over their sample-specific
+                    # parameters.
+                    batch=random.choice(numsamp,min(batchsize,numsamp),replace=False)
 
-                # Update the posterior distributions
-                # over the sample-specific parameters.
-                post.samp[j].copy(prior.samp[j]).update(stat)
+                    priorbatch=dirichbank(len(batch),numgroup).copy([prior.samp[b] for b in batch])
+                    postbatch=dirichbank(len(batch),numgroup).copy([post.samp[b] for b in batch])
 
-            for j in range(numgroup):
+                    tick=lap(timer,'batch',tick)
 
-                # Accumulate the expected sufficient statistics.
-                stat=post.group[j].stat(p[j,:,:] for p in prob)
+                    val,count,stat,local=localfit(post.comp,emiss,priorbatch,postbatch,
+                                                  [obs[b] for b in batch],nu=nu,noisetemp=temp,timer=timer,
+                                                  keeplocal=keeplocal)
 
-                # Update the posterior distributions
-                # over the model-specific group parameters.
-                post.group[j].copy(prior.group[j]).update(stat)
+                    tick=lap(timer,None,tick)
 
-            scale=[p.sum(axis=0) for p in prob]
+                    for b,q in zip(batch,postbatch):
+                        post.samp[b].copy(q)
 
-            for j in range(numcomp):
+                    # Rescale the statistics of the subset to the size of the data, and
+                    # blend them into the running statistics with a decreasing step size.
+                    scale=float(numsamp)/float(len(batch))
+                    rate=1.0 if i==0 else (i+stepdelay)**(-stepdecay)
 
-                # Accumulate the expected sufficient statistics.
-                stat=post.comp[j].stat(([x,w[j,:],s[j,:]] for x,w,s in zip(obs,weight,scale)),
-                                       weighted=True,scaled=True)
+                    val*=scale
 
-                # Update the posterior distributions over
-                # the model-specific component parameters.
-                post.comp[j].copy(prior.comp[j]).update(stat)
+                    if i==0:
+                        runcount=scale*count
+                        runstat=post.comp.merge([stat],scale=[scale])
+                    else:
+                        runcount=(1.0-rate)*runcount+rate*scale*count
+                        runstat=post.comp.merge([runstat,stat],scale=[1.0-rate,rate*scale])
+
+                    count,stat=runcount,runstat
+
+                    tick=lap(timer,'merge',tick)
+
+                # The phases of the sweep keep their own time.
+                tick=lap(timer,None,tick)
+
+                # Evaluate the lower bound on the marginal log-likelihood of the
+                # data. The divergences of the distributions over the model
+                # parameters are only evaluated if the bound is not skipped.
+                if evalbound:
+                    bound.append(val-sum(q.div(p) for p,q in zip(prior.group,post.group))
+                                 -post.comp.div(prior.comp).sum())
+                else:
+                    bound.append(numpy.nan)
+
+                tick=lap(timer,'bound',tick)
+
+                # Reject an extrapolated step which decreased the bound,
+                # and repeat the iteration from the plain step instead.
+                if extrap and bound[-1]<bound[-2]:
+                    self.__extrapolate__(post,plain,plain,1.0)
+                    if hook is not None:
+                        report(i,timer,begin,True)
+                    bound.pop()
+                    relax=1.0
+                    extrap=False
+                    continue
 
-            if i>min(numiter) and isconv(reltol,bound[1:i]):
+                # Prune the groups and the components whose expected number of
+                # observations fell below the threshold, and merge the nearly
+                # identical components, so that the following iterations only
+                # evaluate the remaining ones. The statistics, and the local
+                # quantities of the sets, are folded accordingly. The components
+                # are only merged after the minimum number of iterations, since
+                # they all start from the same prior distribution, and only
+                # separate as the iterations go on.
+                if prunetol is not None or mergetol is not None:
+
+                    fold=self.__prune__(post,count,prunetol,mergetol if i>=min(numiter) else None)
+
+                    if fold is not None:
+
+                        groupmat,compmat=fold
+
+                        count=numpy.dot(groupmat.transpose(),numpy.dot(count,compmat))
+                        stat=post.comp.fold(stat,compmat)
+
+                        if proc is not None:
+                            proc.compact(groupmat,compmat)
+                        else:
+                            local=compactlocal(local,groupmat,compmat)
+
+                        if batchsize is not None:
+                            runcount,runstat=count,stat
+
+                        self.__compact__(post,groupmat,compmat)
+
+                        numgroup,numcomp,numdim=self.__size__
+
+                        groupindex=groupindex[groupmat.argmax(axis=0)]
+                        compindex=compindex[compmat.argmax(axis=0)]
+
+                        # The natural parameters change their size,
+                        # so restart the acceleration with plain steps.
+                        relax=1.0
+
+                    tick=lap(timer,'prune',tick)
+
+                if accel or paramtol is not None:
+                    last=self.__natural__(post)
+
+                self.__update__(post,count,stat)
+
+                # Extrapolate the natural parameters of the distributions over
+                # the model parameters along the step of the plain update. The
+                # step size grows while the bound keeps increasing, and is reset
+                # if the extrapolated parameters are not valid.
+                if accel:
+                    plain=self.__natural__(post)
+                    extrap=relax>1.0 and self.__extrapolate__(post,last,plain,relax)
+                    relax=accelrate*relax if extrap or relax==1.0 else 1.0
+
+                tick=lap(timer,'update',tick)
+
+                if hook is not None:
+                    report(i,timer,begin,False)
+
+                # The bound of a stochastic update is only an estimate,
+                # so the stochastic updates run for a fixed number of
+                # iterations. A bound which is only evaluated every few
+                # iterations changes more between the evaluations.
+                if batchsize is None and i>min(numiter)\
+                   and isconv(boundstep*reltol,[b for b in bound[1:i] if not numpy.isnan(b)]):
+                    break
+
+                # Alternatively, stop once the largest change of the natural
+                # parameters is small relative to their magnitude.
+                if paramtol is not None and i>min(numiter):
+                    change=max(numpy.nanmax(numpy.abs(c-l))/max(numpy.nanmax(numpy.abs(c)),numpy.spacing(1.0))
+                               for l,c in zip(last,self.__natural__(post)))
+                    if change<paramtol:
+                        break
+
+                # Periodically save the state of the run, unless
+                # there are no more iterations to continue from.
+                if checkpoint is not None and (i+1)%checkpointiter==0 and i+1<max(numiter):
+
+                    # Only the distributions over the sample-specific
+                    # parameters are saved, so the local quantities of
+                    # the sets are left in the workers.
+                    if proc is not None:
+                        post.samp=proc.fetch(local=False)
+
+                    self.__checkpoint__(checkpoint,post,i+1,bound,
+                                        (runcount,runstat) if batchsize is not None else None,
+                                        (groupindex,compindex),(relax,extrap,plain) if accel else None)
+
+            if proc is not None:
+
+                # Collect the distributions over the sample-specific
+                # parameters, and the local quantities of the sets.
+                post.samp,prob,weight,cond=proc.fetch()
+
+            elif batchsize is None:
+                prob,weight,cond=local
+
+            else:
+
+                prob,weight,cond=[None]*numsamp,[None]*numsamp,[None]*numsamp
+
+                # Only the local quantities of the
+                # last subset of sets are available.
+                for b,r,w,c in zip(batch,*local):
+                    prob[b],weight[b],cond[b]=r,w,c
+
+        finally:
+            if proc is not None:
+                proc.close()
+
+        self.__post__=post
+
+        # Keep the statistics which yield the posterior distributions,
+        # so that the model can be updated incrementally.
+        self.__stat__=count,stat
+
+        if fullprob:
+
+            # Expand the probabilities of the groups and the components
+            # jointly, rather than the probabilities of the components.
+            prob=[c[:,:,numpy.newaxis]*p[numpy.newaxis,:,:] if p is not None else None
+                  for c,p in zip(cond,prob)]
+
+        # Return the history of the bound up to the last iteration. If the
+        # bound of that iteration was skipped, then return the history up
+        # to the last evaluation instead, e.g. that of the final iteration.
+        # Only the bounds which were evaluated are returned.
+        hist=bound[:i]
+        if len(hist)>0 and numpy.isnan(hist[-1]):
+            hist=bound[:max(k for k,b in enumerate(bound) if not numpy.isnan(b))+1]
+
+        return prob,weight,[b for b in hist if not numpy.isnan(b)]
+
+    def restart(self,*obs,numrestart=10,workers=1,racestart=10,racetol=1.0e-3,numiter=[10,1000],**kwargs):
+
+        # Check that the number of restarts, the number of processes
+        # and the margin of the race are valid. The restarts already
+        # run in separate processes, so each runs in a single one.
+        assert numrestart>0 and workers>0 and racestart>=0 and racetol>=0.0
+        assert kwargs.get('workers',1)<=1 and 'resume' not in kwargs
+
+        seed=random.randint(2**31,size=numrestart)
+
+        # Share the bounds of each iteration of every restart, so
+        # that the restarts which are clearly behind the leader can
+        # be stopped early.
+        board=multiprocessing.RawArray('d',numrestart*max(numiter))
+        numpy.frombuffer(board)[:]=numpy.nan
+
+        arg=[(self,obs,r,seed[r],numrestart,numiter,racestart,racetol,dict(kwargs))
+             for r in range(numrestart)]
+
+        if workers>1:
+            with multiprocessing.Pool(workers,initializer=attach,initargs=(board,)) as proc:
+                result=proc.starmap(race,arg)
+        else:
+            attach(board)
+            result=[race(*a) for a in arg]
+
+        # Keep the restart with the highest final bound, including the
+        # size and the prior distributions of its model, which differ
+        # from those of the others if it was pruned.
+        val,size,prior,post,stat,prob,weight,bound=max((r for r in result if r is not None),key=lambda r:r[0])
+
+        self.__size__=size
+        self.__prior__=prior
+        self.__post__=post
+        self.__stat__=stat
+
+        return prob,weight,bound
+
+    def partialfit(self,*obs,alpha=numpy.inf,nu=numpy.inf,forget=1.0,
+                   numiter=[2,100],noisetemp=1.0e-2,reltol=1.0e-6,keeplocal=True):
+
+        numgroup,numcomp,numdim=self.__size__
+
+        obs,numpoint=self.__sets__(obs)
+
+        # Check that the forgetting factor is valid.
+        assert 0.0<forget<=1.0
+
+        prior=self.__prior__
+        post=self.__post__
+
+        # Check that the posterior distributions come with the statistics
+        # which yield them, since only those of the new sets are revised.
+        assert post is None or self.__stat__ is not None
+
+        if post is None:
+
+            post=model.paramdist()
+
+            # Initialize the posterior distributions
+            # over the model-specific parameters.
+            post.group=copy.deepcopy(prior.group)
+            post.comp=copy.deepcopy(prior.comp)
+
+        # Initialize the distributions over the
+        # sample-specific parameters of the new sets.
+        priorsamp=dirichbank(len(obs),numgroup,alpha=alpha)
+        postsamp=dirichbank(len(obs),numgroup,alpha=alpha)
+        postsamp.alpha+=numpoint
+
+        # Discount the statistics of the data seen before.
+        if self.__stat__ is not None:
+            runcount,runstat=self.__stat__
+            runcount=forget*runcount
+            runstat=post.comp.merge([runstat],scale=[forget])
+
+        bound=[]
+
+        for i in range(max(numiter)):
+
+            emiss=numpy.array([q.loglik() for q in post.group])
+
+            # Only add noise in order to break ties if
+            # the model has not seen any data before.
+            temp=noisetemp if i==0 and self.__stat__ is None else None
+
+            # Fit the distributions over the sample-specific parameters of the
+            # new sets, while the distributions over the model parameters are
+            # fixed. The sets of a corpus are fitted one chunk at a time.
+            val,count,stat,local=localfit(post.comp,emiss,priorsamp,postsamp,obs,nu=nu,noisetemp=temp,
+                                          keeplocal=keeplocal)
+
+            # Evaluate the lower bound on the marginal log-likelihood of the new sets.
+            bound.append(val-sum(q.div(p) for p,q in zip(prior.group,post.group))
+                         -post.comp.div(prior.comp).sum())
+
+            # The statistics are additive, so the statistics of
+            # the new sets are added to those seen before. Only
+            # the statistics of the new sets are revised.
+            if self.__stat__ is not None:
+                count=runcount+count
+                stat=post.comp.merge([runstat,stat])
+
+            self.__update__(post,count,stat)
+
+            if i>=min(numiter) and isconv(reltol,bound):
                 break
 
         self.__post__=post
+        self.__stat__=count,stat
+
+        prob,weight,cond=local
+
+        return prob,weight,bound
+
+    def stream(self,sets,batchsize=1,**kwargs):
+
+        assert batchsize>0
+
+        batch=[]
+
+        # Update the model with each batch
+        # of sets as soon as it is complete.
+        for x in sets:
+            batch.append(x)
+            if len(batch)==batchsize:
+                yield self.partialfit(*batch,**kwargs)
+                batch=[]
+
+        if len(batch)>0:
+            yield self.partialfit(*batch,**kwargs)
+
+    def __local__(self,*obs,alpha=numpy.inf,nu=numpy.inf,numiter=100,reltol=1.0e-6):
+
+        numgroup,numcomp,numdim=self.__size__
+
+        obs,numpoint=self.__sets__(obs)
+
+        # By default, select the posterior distributions over the model
+        # parameters. If they are not initialized, then select the prior.
+        dist=self.__post__ if self.__post__ is not None else self.__prior__
+
+        # The expected log-likelihoods of the groups do not change
+        # while the distributions over the model parameters are fixed.
+        emiss=numpy.array([q.loglik() for q in dist.group])
+
+        # The sets are independent while the distributions over the model
+        # parameters are fixed, so the sets of a corpus are fitted one
+        # chunk at a time.
+        if isinstance(obs,corpus):
+            span=list(obs.chunks())
+        else:
+            span=[(0,len(obs))]
+
+        pi=numpy.zeros([len(obs),numgroup])
+        bound=numpy.zeros(len(obs))
+
+        prob=[]
+
+        for i,j in span:
+
+            # Initialize the distributions over the
+            # sample-specific parameters of the sets.
+            prior=dirichbank(j-i,numgroup,alpha=alpha)
+            post=dirichbank(j-i,numgroup,alpha=alpha)
+            post.alpha+=numpoint[i:j]
+
+            # Iterate the updates of the distributions over the sample-specific
+            # parameters of all the sets at once, until they converge.
+            bound[i:j],r,weight,cond,count,offset=localiter(dist.comp,emiss,prior,post,obs[i:j],nu=nu,
+                                                            numiter=numiter,reltol=reltol)
+
+            pi[i:j,:]=post.pi
+
+            prob.extend(r[:,a:b] for a,b in zip(offset[:-1],offset[1:]))
+
+        return pi,prob,bound
+
+    def transform(self,*obs,alpha=numpy.inf,nu=numpy.inf,numiter=100,reltol=1.0e-6):
+
+        pi,prob,bound=self.__local__(*obs,alpha=alpha,nu=nu,numiter=numiter,reltol=reltol)
+
+        # Return the expected mixing proportions of the groups in each
+        # set, and the probabilities of the components given the
+        # observations.
+        return pi,prob
+
+    def score(self,*obs,alpha=numpy.inf,nu=numpy.inf,numiter=100,reltol=1.0e-6):
+
+        pi,prob,bound=self.__local__(*obs,alpha=alpha,nu=nu,numiter=numiter,reltol=reltol)
+
+        # Return the lower bounds on the marginal log-likelihoods of the sets,
+        # less the divergences of the distributions over the model parameters.
+        return bound
+
+    def save(self,path):
+
+        numgroup,numcomp,numdim=self.__size__
+
+        # Store the prior distributions, followed by the
+        # posterior distributions if they are initialized.
+        dist=[self.__prior__]
+        if self.__post__ is not None:
+            dist.append(self.__post__)
+
+        sigma=numpy.shape(self.__prior__.comp.sigma)
+
+        # Lay out the parameters of each set of distributions as one
+        # record of contiguous arrays. The record of the posterior
+        # distributions also holds the statistics which yield them.
+        rec=numpy.zeros(len(dist),dtype=[('grouppi',numpy.float64,(numgroup,numcomp)),
+                                         ('groupalpha',numpy.float64,(numgroup,)),
+                                         ('compmu',numpy.float64,(numcomp,numdim)),
+                                         ('compomega',numpy.float64,(numcomp,)),
+                                         ('compsigma',numpy.float64,sigma),
+                                         ('competa',numpy.float64,(numcomp,)),
+                                         ('hasstat',numpy.bool_),
+                                         ('count',numpy.float64,(numgroup,numcomp)),
+                                         ('statmu',numpy.float64,(numcomp,numdim)),
+                                         ('statomega',numpy.float64,(numcomp,)),
+                                         ('statsigma',numpy.float64,sigma),
+                                         ('stateta',numpy.float64,(numcomp,))])
+
+        for r,d in zip(rec,dist):
+            r['grouppi']=[q.pi for q in d.group]
+            r['groupalpha']=[q.alpha for q in d.group]
+            r['compmu']=d.comp.mu
+            r['compomega']=d.comp.omega
+            r['compsigma']=d.comp.sigma
+            r['competa']=d.comp.eta
+
+        # Store the statistics, so that a loaded
+        # model can be updated incrementally.
+        if self.__post__ is not None and self.__stat__ is not None:
+            count,stat=self.__stat__
+            rec[1]['hasstat']=True
+            rec[1]['count']=count
+            rec[1]['statmu']=stat.mu
+            rec[1]['statomega']=stat.omega
+            rec[1]['statsigma']=stat.sigma
+            rec[1]['stateta']=stat.eta
+
+        with open(path,'wb') as f:
+            numpy.save(f,rec)
+
+    def load(self,path,mmap=False):
+
+        numgroup,numcomp,numdim=self.__size__
+
+        # Map the file copy-on-write, so that the pages are shared by every
+        # process which loads the model, until the parameters are revised.
+        rec=numpy.load(path,mmap_mode='c' if mmap else None)
+
+        # Check that the file is consistent with the size and the type of the model.
+        assert 0<len(rec)<=2
+        assert rec.dtype['grouppi'].shape==(numgroup,numcomp)
+        assert rec.dtype['compsigma'].shape==numpy.shape(self.__prior__.comp.sigma)
+
+        dist=[]
+
+        for i in range(len(rec)):
+
+            d=model.paramdist()
+
+            # The distributions use views into
+            # the arrays, rather than copies.
+            d.group=[dirich(numcomp,pi=rec['grouppi'][i,j],alpha=float(rec['groupalpha'][i,j]))
+                     for j in range(numgroup)]
+
+            d.comp=copy.copy(self.__prior__.comp)
+            d.comp.__param__=type(d.comp).param()
+            d.comp.__param__.mu=rec['compmu'][i]
+            d.comp.__param__.omega=rec['compomega'][i]
+            d.comp.__param__.sigma=rec['compsigma'][i]
+            d.comp.__param__.eta=rec['competa'][i]
+            d.comp.__cache__=None
+
+            dist.append(d)
+
+        self.__prior__=dist[0]
+        self.__post__=dist[1] if len(dist)>1 else None
+        self.__stat__=None
+
+        # Restore the statistics which yield the posterior distributions.
+        # Files which do not hold them can not be updated incrementally.
+        if len(rec)>1 and 'hasstat' in rec.dtype.names and rec['hasstat'][1]:
+            stat=type(self.__prior__.comp).param()
+            stat.mu=rec['statmu'][1]
+            stat.omega=rec['statomega'][1]
+            stat.sigma=rec['statsigma'][1]
+            stat.eta=rec['stateta'][1]
+            self.__stat__=rec['count'][1],stat
 
-        return prob,weight,bound[:i]
+        return self
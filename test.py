@@ -172,7 +172,7 @@ loc,scale=zip(*[(mod.comp[k].mu,mod.comp[k].sigma) for k in range(numcomp)])
 # this time color the points according to their
 # probabilistic component assignments.
 fig,axis=scatterplot(numpy.concatenate(obs,axis=1),
-                     numpy.concatenate([p.sum(axis=0) for p in prob],axis=1),
+                     numpy.concatenate(prob,axis=1),
                      loc=loc,scale=scale)
 
 fig.canvas.set_window_title('Clustering results')